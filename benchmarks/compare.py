@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+'''
+Created by Samvel Khalatyan, Sep 14, 2012
+Copyright 2012, All rights reserved
+'''
+
+from __future__ import division, print_function
+
+import json
+import sys
+
+def compare(reference, result, threshold=0.1):
+    '''
+    Compare minimum times of each stage in two benchmark results. List of
+    (stage, reference time, result time, ratio, is regression) is returned:
+    stage is a regression if it is slower by more than threshold fraction
+    '''
+
+    rows = []
+    for stage in sorted(set(reference["results"]) | set(result["results"])):
+        old = reference["results"].get(stage)
+        new = result["results"].get(stage)
+        if not old or not new:
+            rows.append((stage,
+                         old["min"] if old else None,
+                         new["min"] if new else None,
+                         None,
+                         False))
+
+            continue
+
+        ratio = new["min"] / old["min"] if old["min"] else None
+        rows.append((stage, old["min"], new["min"], ratio,
+                     ratio is not None and ratio > 1 + threshold))
+
+    return rows
+
+def main():
+    from optparse import OptionParser
+
+    parser_ = OptionParser(usage="usage: %prog [options] reference.json "
+                                 "result.json")
+    parser_.add_option("-t", "--threshold", action="store", type="float",
+                       default=0.1,
+                       help="fraction of slow down to be reported, e.g. 0.1")
+
+    options, args = parser_.parse_args()
+    if 2 != len(args):
+        parser_.print_help()
+
+        return 1
+
+    reports = []
+    for filename in args:
+        with open(filename) as input_:
+            reports.append(json.load(input_))
+
+    if reports[0]["parameters"] != reports[1]["parameters"]:
+        print("warning: benchmarks were run with different parameters",
+              file=sys.stderr)
+
+    def format_(value, fmt="{0:.4f}"):
+        return "-" if value is None else fmt.format(value)
+
+    print("{0:<20} {1:>10} {2:>10} {3:>7}".format("stage", "reference",
+                                                  "result", "ratio"))
+
+    regressions = 0
+    for stage, old, new, ratio, regression in compare(
+            reports[0], reports[1], options.threshold):
+
+        print("{0:<20} {1:>10} {2:>10} {3:>7}{4}".format(
+              stage, format_(old), format_(new),
+              format_(ratio, "{0:.2f}"),
+              "  <- regression" if regression else ""))
+
+        regressions += regression
+
+    return 1 if regressions else 0
+
+if "__main__" == __name__:
+    sys.exit(main())
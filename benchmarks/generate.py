@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+
+'''
+Created by Samvel Khalatyan, Sep 14, 2012
+Copyright 2012, All rights reserved
+'''
+
+from __future__ import division, print_function
+
+import os
+import sys
+
+import numpy
+import yaml
+
+from config import cache, channel
+
+def _plot_names(plot_config, dirs, plots):
+    '''
+    Select plots from the plot config keeping the folders order. Synthetic
+    folders and plots are added if config does not have enough of these
+    '''
+
+    folders = []
+    names = {}
+    for plot_ in plot_config["plot"]:
+        folder, name = plot_["name"].rsplit('/', 1)
+        if folder not in names:
+            folders.append(folder)
+            names[folder] = []
+
+        names[folder].append(name)
+
+    for index in range(len(folders), dirs):
+        folders.append("/Dir{0}".format(index))
+        names[folders[-1]] = []
+
+    result = []
+    for folder in folders[:dirs]:
+        folder_names = names[folder][:plots]
+        folder_names.extend("plot{0}".format(index)
+                            for index in range(len(folder_names), plots))
+
+        result.extend(folder + '/' + name for name in folder_names)
+
+    return result
+
+def generate(path, channel_config, plot_config,
+             channels="mc,data", inputs=2, dirs=5, plots=10, bins=100,
+             entries=10000, prefix="bench", seed=1):
+    '''
+    Generate synthetic input files with the structure taken from the channel
+    and plot configs:
+
+        path            output folder
+        channel_config  channel config to take channels and inputs from
+        plot_config     plot config to take folders and plots from
+        channels        comma separated channels to generate inputs for
+        inputs          maximum number of inputs per channel
+        dirs            number of folders in each input
+        plots           number of plots in each folder
+        bins            number of bins in each plot
+        entries         average number of entries in each plot
+        prefix          input files prefix
+
+    The channel and plot configs with only generated inputs and plots are
+    saved next to the inputs. Dictionary with prefix, configs filenames,
+    channels and inputs filenames is returned
+    '''
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    ch_config = channel.load(channel_config)
+
+    with open(channel_config, "rb") as input_:
+        ch_raw = yaml.load(input_, Loader=cache.Loader)
+
+    with open(plot_config, "rb") as input_:
+        plt_raw = yaml.load(input_, Loader=cache.Loader)
+
+    # inputs of each requested channel
+    #
+    channels_ = channel.expand(ch_config,
+                               set(ch.strip() for ch in channels.split(',')))
+    if not channels_:
+        raise RuntimeError("no channels to generate: " + channels)
+
+    names = set()
+    for channel_ in channels_:
+        enabled = [input_ for input_ in ch_config["channel"][channel_]["inputs"]
+                   if ch_config["input"][input_]["enable"]]
+        names.update(enabled[:inputs])
+
+    # save channel config with only generated inputs turned ON, each input
+    # is normalized to exercise scaling
+    #
+    for input_ in ch_raw["input"]:
+        enable = input_["name"] in names
+        input_["enable"] = enable
+        if enable and not input_["name"].startswith("DATA"):
+            input_["events"] = entries
+            input_["xsection"] = 1.0
+
+    ch_filename = os.path.join(path, prefix + ".input.yaml")
+    with open(ch_filename, "w") as output_:
+        yaml.safe_dump(ch_raw, output_)
+
+    # save plot config with the generated plots
+    #
+    plot_paths = _plot_names(plt_raw, dirs, plots)
+    plt_config = dict((plot_["name"], plot_) for plot_ in plt_raw["plot"])
+    plt_raw["plot"] = [plt_config.get(path_, {"name": path_,
+                                              "rebin": None,
+                                              "range": None,
+                                              "units": None,
+                                              "title": path_.rsplit('/')[-1]})
+                       for path_ in plot_paths]
+
+    plt_filename = os.path.join(path, prefix + ".plot.yaml")
+    with open(plt_filename, "w") as output_:
+        yaml.safe_dump(plt_raw, output_)
+
+    # ROOT is imported only here otherwise PyROOT intercepts --help option
+    from root.hist import Hist
+    from template import export
+
+    random = numpy.random.RandomState(seed)
+    filenames = []
+    for input_ in sorted(names):
+        objects = {}
+        for path_ in plot_paths:
+            contents = random.poisson(entries / bins,
+                                      size=bins + 2).astype('d')
+
+            objects[path_] = Hist(
+                    axes=[{"bins": bins, "min": 0, "max": bins,
+                           "edges": None, "title": ""}],
+                    contents=contents,
+                    sumw2=contents.copy(),
+                    name=path_.rsplit('/', 1)[1],
+                    entries=contents.sum()).to_th1()
+
+        filename = os.path.join(path, "{0}.{1}.root".format(prefix, input_))
+        export.write_root(filename, objects)
+        filenames.append(filename)
+
+    return {"prefix": os.path.join(path, prefix),
+            "channel_config": ch_filename,
+            "plot_config": plt_filename,
+            "channels": sorted(channels_),
+            "inputs": filenames}
+
+if "__main__" == __name__:
+    from optparse import OptionParser
+
+    parser_ = OptionParser(usage="usage: %prog [options] output_folder")
+    parser_.add_option("--channel-config", action="store",
+                       default="config/2012.input.yaml",
+                       help="channel config to take inputs from")
+    parser_.add_option("--plot-config", action="store",
+                       default="config/2012.plot.yaml",
+                       help="plot config to take plots from")
+    parser_.add_option("--channels", action="store", default="mc,data",
+                       help="comma separated channels")
+    parser_.add_option("--inputs", action="store", type="int", default=2,
+                       help="maximum number of inputs per channel")
+    parser_.add_option("--dirs", action="store", type="int", default=5,
+                       help="number of folders in each input")
+    parser_.add_option("--plots", action="store", type="int", default=10,
+                       help="number of plots in each folder")
+    parser_.add_option("--bins", action="store", type="int", default=100,
+                       help="number of bins in each plot")
+
+    options, args = parser_.parse_args()
+    if 1 != len(args):
+        parser_.print_help()
+
+        sys.exit(1)
+
+    info = generate(args[0], options.channel_config, options.plot_config,
+                    channels=options.channels, inputs=options.inputs,
+                    dirs=options.dirs, plots=options.plots,
+                    bins=options.bins)
+
+    print("generated", len(info["inputs"]), "inputs with prefix",
+          info["prefix"])
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+'''
+Created by Samvel Khalatyan, Sep 14, 2012
+Copyright 2012, All rights reserved
+'''
+
+from __future__ import division, print_function
+
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import numpy
+
+from benchmarks import generate
+from config import channel, plot
+
+def _commit():
+    '''Get current git commit or None if it is not available'''
+
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(
+                    ["git", "rev-parse", "HEAD"],
+                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                    stderr=devnull).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class Benchmark(object):
+    '''
+    Time the load/merge/plot pipeline stages on synthetic inputs
+
+    Each stage is run repeat times and all measured wall times are kept
+    '''
+
+    def __init__(self, info, repeat=3, jobs=1):
+        ''' Initialize benchmark
+
+        the arguments are:
+
+            info    generated inputs description (see benchmarks.generate)
+            repeat  number of times each stage is run
+            jobs    number of processes used by Templates
+        '''
+
+        self._info = info
+        self._repeat = repeat
+        self._jobs = jobs
+
+        self.results = {}
+
+    def measure(self, stage, function):
+        '''
+        Run function repeat times and store wall times. The function may
+        return time to be used instead of the measured one, e.g. if only part
+        of the function should be timed
+        '''
+
+        times = []
+        for repeat in range(self._repeat):
+            start = timeit.default_timer()
+            elapsed = function()
+            times.append(elapsed if elapsed is not None
+                         else timeit.default_timer() - start)
+
+        self.results[stage] = {"min": min(times),
+                               "mean": sum(times) / len(times),
+                               "times": times}
+
+        return self.results[stage]
+
+    def run(self):
+        '''Run all stages'''
+
+        # ROOT is imported only here otherwise PyROOT intercepts --help option
+        import ROOT
+
+        from root import style
+        from template import loader
+
+        ROOT.gROOT.SetBatch(True)
+
+        root_style = style.analysis()
+        root_style.cd()
+
+        ROOT.gROOT.ForceStyle()
+
+        ch_config = channel.load(self._info["channel_config"])
+        plt_config = plot.load(self._info["plot_config"])
+
+        def input_loader():
+            for filename in self._info["inputs"]:
+                loader.InputLoader().load(filename)
+
+        def channel_loader():
+            for channel_ in self._info["channels"]:
+                loader.ChannelLoader(self._info["prefix"]).load(
+                        ch_config, plt_config, channel_)
+
+        def templates_load():
+            self._templates().load()
+
+        def templates_plot():
+            app = self._templates()
+            app.load()
+
+            start = timeit.default_timer()
+            for canvas in app.plot() or []:
+                app.close_canvas(canvas)
+
+            return timeit.default_timer() - start
+
+        def templates_save():
+            app = self._templates()
+            app.load()
+
+            elapsed = 0
+            for canvas in app.plot() or []:
+                start = timeit.default_timer()
+                app.save_canvas(canvas)
+                elapsed += timeit.default_timer() - start
+
+                app.close_canvas(canvas)
+
+            return elapsed
+
+        for stage, function in (("InputLoader.load", input_loader),
+                                ("ChannelLoader.load", channel_loader),
+                                ("Templates.load", templates_load),
+                                ("Templates.plot", templates_plot),
+                                ("Templates.save", templates_save)):
+
+            result = self.measure(stage, function)
+
+            print("{0:<20} min: {1:<8.4f} mean: {2:<8.4f}".format(
+                  stage, result["min"], result["mean"]))
+
+        return self.results
+
+    def _templates(self):
+        '''Create Templates for the generated inputs'''
+
+        from template import options, templates
+
+        options_, args = options.parser().parse_args([
+                "--batch",
+                "--no-cache",
+                "--save", "pdf",
+                "--jobs", str(self._jobs),
+                "--channel-config", self._info["channel_config"],
+                "--plot-config", self._info["plot_config"],
+                "--channels", ','.join(self._info["channels"]),
+                "--prefix", self._info["prefix"]])
+
+        config_ = {"core": {"batch": True, "verbose": False},
+                   "template": {"channel": None, "plot": None}}
+
+        return templates.Templates(options_, args, config_)
+
+def main():
+    from optparse import OptionParser
+
+    parser_ = OptionParser(usage="usage: %prog [options]")
+    parser_.add_option("--channel-config", action="store",
+                       default="config/2012.input.yaml",
+                       help="channel config to take inputs from")
+    parser_.add_option("--plot-config", action="store",
+                       default="config/2012.plot.yaml",
+                       help="plot config to take plots from")
+    parser_.add_option("--channels", action="store", default="mc,data",
+                       help="comma separated channels")
+    parser_.add_option("--inputs", action="store", type="int", default=2,
+                       help="maximum number of inputs per channel")
+    parser_.add_option("--dirs", action="store", type="int", default=5,
+                       help="number of folders in each input")
+    parser_.add_option("--plots", action="store", type="int", default=10,
+                       help="number of plots in each folder")
+    parser_.add_option("--bins", action="store", type="int", default=100,
+                       help="number of bins in each plot")
+    parser_.add_option("-r", "--repeat", action="store", type="int",
+                       default=3,
+                       help="number of times each stage is run")
+    parser_.add_option("-j", "--jobs", action="store", type="int", default=1,
+                       help="number of processes used by templates")
+    parser_.add_option("--work-dir", action="store", default=None,
+                       help=("folder for generated inputs and saved canvases; "
+                             "temporary folder is used and removed otherwise"))
+    parser_.add_option("-o", "--output", action="store", default=None,
+                       help="save results in JSON file")
+
+    options, args = parser_.parse_args()
+
+    parameters = {"channels": options.channels,
+                  "inputs": options.inputs,
+                  "dirs": options.dirs,
+                  "plots": options.plots,
+                  "bins": options.bins,
+                  "repeat": options.repeat,
+                  "jobs": options.jobs}
+
+    channel_config = os.path.abspath(options.channel_config)
+    plot_config = os.path.abspath(options.plot_config)
+
+    work_dir = options.work_dir or tempfile.mkdtemp(prefix="exo_bench_")
+    pwd = os.getcwd()
+    try:
+        info = generate.generate(work_dir, channel_config, plot_config,
+                                 channels=options.channels,
+                                 inputs=options.inputs,
+                                 dirs=options.dirs,
+                                 plots=options.plots,
+                                 bins=options.bins)
+
+        # canvases are saved into the working folder
+        os.chdir(work_dir)
+
+        benchmark = Benchmark(info, repeat=options.repeat, jobs=options.jobs)
+        results = benchmark.run()
+    finally:
+        os.chdir(pwd)
+
+        if not options.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    import ROOT
+
+    report = {"parameters": parameters,
+              "environment": {"python": platform.python_version(),
+                              "root": ROOT.gROOT.GetVersion(),
+                              "numpy": numpy.__version__,
+                              "commit": _commit()},
+              "results": results}
+
+    if options.output:
+        with open(options.output, 'w') as output_:
+            json.dump(report, output_, indent=4, sort_keys=True)
+
+        print("results are saved in", options.output)
+
+    return 0
+
+if "__main__" == __name__:
+    sys.exit(main())
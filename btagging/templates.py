@@ -47,9 +47,12 @@ class Templates(templates.Templates):
                             self._btag[key+'_btag'] = self.plots[input+'_bTag'][channel_].Clone()
 
 
-    def plot(self):
+    def render_groups(self):
+        '''Efficiencies are calculated at load: draw serially'''
+
+        return None
 
-        canvases = [] 
+    def plot(self):
 
         for var in ['pt', 'eta', 'phi']:
 
@@ -99,9 +102,7 @@ class Templates(templates.Templates):
             )
 
             if canvas:
-                canvases.append(canvas)
-
-        return canvases        
+                yield canvas
 
 
     def draw_efficiency_canvases(self, plotname, axisname, efficiencies,
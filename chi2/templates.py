@@ -7,12 +7,12 @@ Copyright 2012, All rights reserved
 
 from __future__ import print_function, division
 
-import math
-
+import numpy
 import ROOT
 
 from config import channel
 from root import stats
+from root.hist import Hist
 from template import templates
 
 class SignalOverBackground(templates.Templates):
@@ -26,7 +26,6 @@ class SignalOverBackground(templates.Templates):
     def plot(self):
         ''' Process loaded histograms and draw these '''
 
-        canvases = []
         for plot, channels in self.plots.items():
             signal = ROOT.THStack()
             legend = ROOT.TLegend(0, 0, 0, 0)
@@ -66,9 +65,7 @@ class SignalOverBackground(templates.Templates):
 
             canvas = self.draw_canvas(plot, signal=signal, legend=legend)
             if canvas:
-                canvases.append(canvas)
-
-        return canvases
+                yield canvas
 
     def draw(self, background=None, uncertainty=None, data=None, signal=None):
         ''' Draw smoothened signal '''
@@ -103,10 +100,18 @@ class SignalOverSqrtSignalPlusBackground(SignalOverBackground):
     def transform(self, signal, background):
         ''' Calculate the signal over sqrt(S+B) ratio '''
 
+        background_ = Hist.from_th1(background).contents[1:-1]
         for hist in signal.GetHists():
             hist.GetYaxis().SetTitle("S / #sqrt{S + B}")
-            for bin_ in range(1, hist.GetNbinsX() + 1):
-                hist.SetBinContent(bin_, hist.GetBinContent(bin_) /
-                                         math.sqrt(hist.GetBinContent(bin_) +
-                                         background.GetBinContent(bin_)))
+
+            # only visible bins are transformed, errors are kept
+            hist_ = Hist.from_th1(hist)
+            signal_ = hist_.contents[1:-1]
+            total_ = signal_ + background_
+
+            with numpy.errstate(divide="ignore", invalid="ignore"):
+                hist_.contents[1:-1] = numpy.where(
+                        0 < total_, signal_ / numpy.sqrt(total_), 0)
+
+            hist_.update(hist)
 
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+'''
+Created by Samvel Khalatyan, Jun 18, 2012
+Copyright 2012, All rights reserved
+'''
+
+from __future__ import print_function
+
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+import yaml
+
+from util import timer
+
+# libyaml based loader is an order of magnitude faster than the pure-Python
+# one. It is used if PyYAML is compiled with it
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# post-processed configurations are stored in this folder
+path = os.path.expanduser(os.environ.get("EXO_CONFIG_CACHE",
+                                         "~/.exo/cache/config"))
+
+# the cache may be turned OFF, e.g. with EXO_CONFIG_NO_CACHE=1
+enabled = not os.environ.get("EXO_CONFIG_NO_CACHE")
+
+# increase whenever pickled configuration objects change their layout in a
+# way that is not caught by the modules sources hash
+FORMAT_VERSION = 1
+
+# project modules are found in this folder, e.g. util.arg
+_top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _source(module_name):
+    '''Source of the module or empty string if it is not available'''
+
+    module = sys.modules.get(module_name)
+    filename = getattr(module, "__file__", None)
+    if not filename:
+        return b""
+
+    # compiled modules are next to the sources
+    if filename.endswith((".pyc", ".pyo")):
+        filename = filename[:-1]
+
+    try:
+        with open(filename, "rb") as input_:
+            return input_.read()
+    except (IOError, OSError):
+        return b""
+
+def _dependencies(module_name):
+    '''
+    Names of the project modules the module uses at the top level, e.g.
+    functions imported with from ... import ...; the module itself is first
+    '''
+
+    module = sys.modules.get(module_name)
+    names = set()
+    for value in vars(module).values() if module else []:
+        name = (value.__name__ if isinstance(value, type(sys))
+                else getattr(value, "__module__", None))
+        filename = getattr(sys.modules.get(name), "__file__", None)
+        if (filename and
+            os.path.abspath(filename).startswith(_top + os.sep)):
+
+            names.add(name)
+
+    names.discard(module_name)
+
+    return [module_name] + sorted(names)
+
+@timer.Timer(label="config load")
+def load(filename, process=None):
+    '''
+    Load YAML configuration and post-process it with the process function,
+    e.g. process(cfg) returns the configuration to be used
+
+    The post-processed configuration is pickled and re-used as long as the
+    YAML file contents and the source of the process function module do not
+    change, e.g. helpers and classes pickled with the configuration are in
+    the same module. The configuration is parsed from scratch if the cache
+    is turned OFF or can not be used, e.g. folder is read-only
+
+    RuntimeError is raised if file does not exist or has no data
+    '''
+
+    if not os.path.exists(filename):
+        raise RuntimeError("yaml config file does not exist: " + filename)
+
+    with open(filename, "rb") as input_:
+        data = input_.read()
+
+    if not enabled:
+        return _parse(filename, data, process)
+
+    key = hashlib.sha1(data)
+    if process:
+        key.update("{0}.{1}".format(process.__module__,
+                                    process.__name__).encode("utf-8"))
+
+        # cached configuration is stale once the process module or any
+        # project module it uses changes
+        for name in _dependencies(process.__module__):
+            key.update(_source(name))
+    key.update(_source(__name__))
+    key.update(repr((FORMAT_VERSION, sys.version_info[:2])).encode("utf-8"))
+
+    cache_filename = os.path.join(path, key.hexdigest() + ".pickle")
+    try:
+        with open(cache_filename, "rb") as input_:
+            return pickle.load(input_)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError,
+            AttributeError, ImportError, IndexError, ValueError):
+        pass
+
+    cfg = _parse(filename, data, process)
+
+    try:
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        # write into temporary file first so that other processes never see
+        # incomplete file
+        handle, tmp_filename = tempfile.mkstemp(dir=path, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as output_:
+                pickle.dump(cfg, output_, pickle.HIGHEST_PROTOCOL)
+
+            os.rename(tmp_filename, cache_filename)
+        except:
+            os.remove(tmp_filename)
+
+            raise
+    except (IOError, OSError):
+        # configuration is still valid even if it could not be cached
+        pass
+
+    return cfg
+
+def _parse(filename, data, process=None):
+    '''Parse YAML data and post-process the configuration'''
+
+    cfg = yaml.load(data, Loader=Loader)
+    if not cfg:
+        raise RuntimeError("failed to read yaml config: " + filename)
+
+    if process:
+        cfg = process(cfg)
+
+    return cfg
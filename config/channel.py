@@ -7,9 +7,9 @@ Copyright 2012, All rights reserved
 
 from __future__ import print_function
 
-import os
 import re
-import yaml
+
+import cache
 
 def load(filename):
     '''
@@ -20,18 +20,17 @@ def load(filename):
         - file does not exist
         - reading YAML config failed or contains no Data
 
-    A loaded YAML config data is returned
+    A loaded YAML config data is returned. The processed configuration is
+    cached, see config.cache
     '''
 
-    if not os.path.exists(filename):
-        raise RuntimeError("yaml config file does not exist: " + filename)
-
-    cfg = None
-    with open(filename) as input_:
-        cfg = yaml.load('\n'.join(input_.readlines()))
+    return cache.load(filename, process)
 
-    if not cfg:
-        raise RuntimeError("failed to read yaml config: " + filename)
+def process(cfg):
+    '''
+    Sum colors, convert inputs and channels into dictionaries and validate
+    channels order
+    '''
 
     # Convert colors from list to the value, e.g.:
     # [10, 5] -> 15
@@ -59,8 +58,44 @@ def load(filename):
         raise RuntimeError("channels order has undefined channels: " +
                            ','.join(new_channels))
 
+    # Channels abbreviations are expanded many times: index these once
+    #
+    cfg["expand_index"] = index(cfg)
+
     return cfg
 
+def index(config):
+    '''
+    Build channel abbreviations index. The index is a dictionary with:
+
+        on          abbreviation -> frozenset of channels with at least one
+                    input turned ON
+        off         abbreviation -> frozenset of channels with all inputs
+                    turned OFF
+        channels    frozenset of all channels
+    '''
+
+    channels = frozenset(config["channel"].keys())
+    index_ = {"on": {}, "off": {}, "channels": channels}
+    for abbreviation, pattern in config.get("expand", {}).items():
+        pattern = re.compile(pattern)
+
+        # Get list of channels that match abbreviation, e.g. narrow Z'
+        #
+        channel = set(c for c in channels if pattern.match(c))
+
+        # Get sub-set of the above channels that have at least one input
+        # turned ON
+        #
+        ch_on = frozenset(c for c in channel
+                          if any(config["input"][i]["enable"]
+                                 for i in config["channel"][c]["inputs"]))
+
+        index_["on"][abbreviation] = ch_on
+        index_["off"][abbreviation] = frozenset(channel - ch_on)
+
+    return index_
+
 def expand(config, channels, verbose=False):
     '''
     Expand any channel abbreviations in the set of channels
@@ -75,47 +110,30 @@ def expand(config, channels, verbose=False):
         zpwide  Z' 10% width
         kk      KK gluon
         mc      All Monte-Carlo nominal backgrounds
-    '''
 
-    def expand_(config, pattern):
-        '''
-        Search for channels that match pattern, remove those that have all
-        inputs turned OFF
-        '''
-
-        # Get list of channels that match narrow Z'
-        #
-        channel = set(c for c in config["channel"].keys() if pattern.match(c))
+    Abbreviations are looked up in the index that is built once and stored in
+    the config under expand_index key
+    '''
 
-        # Get sub-set of the above channels that have at least one input
-        # turned ON
-        #
-        ch_on = set(c for c in channel
-                    if any(config["input"][i]["enable"]
-                           for i in config["channel"][c]["inputs"]))
+    index_ = config.get("expand_index")
+    if index_ is None:
+        index_ = config["expand_index"] = index(config)
 
-        # Get all the channels to be removed
-        #
-        ch_off = channel - ch_on
+    # Process abbreviations
+    #
+    for abbreviation in channels & set(index_["on"].keys()):
+        channels.remove(abbreviation)
 
+        ch_off = index_["off"][abbreviation]
         if ch_off and verbose:
             print("warning: some of the channels have all inputs turned OFF -",
                   ','.join(ch_off))
 
-        return ch_on
-
-    # Process abbreviations
-    #
-    for abbreviation, pattern in config.get("expand", {}).items():
-        if abbreviation in channels:
-            pattern = re.compile(pattern)
-            channels.remove(abbreviation)
-
-            channels.update(expand_(config, pattern))
+        channels |= index_["on"][abbreviation]
 
     # Make sure all of the expanded channels are supported
     #
-    ch_unsupported = channels - set(config["channel"].keys())
+    ch_unsupported = channels - index_["channels"]
 
     if ch_unsupported and verbose:
         print("warning: removing unsupported channels -",
@@ -133,7 +151,7 @@ if "__main__" == __name__:
     for key, values in cfg.items():
         print(("-- {0} --".format(key)).ljust(80, '-'))
 
-        if key in ["luminosity", "order"]:
+        if key in ["luminosity", "order", "expand_index"]:
             print(format_str.format("", values))
 
         else:
@@ -7,40 +7,143 @@ Copyright 2012, All rights reserved
 
 from __future__ import print_function
 
-import os
-import yaml
+import collections
+import re
+
+import cache
+from util.arg import translate
 
 def load(filename):
     '''
     Load plot YAML configuration
     '''
 
-    if not os.path.exists(filename):
-        raise RuntimeError("yaml config file does not exist: " + filename)
-
-    cfg = None
-    with open(filename) as input_:
-        cfg = yaml.load('\n'.join(input_.readlines()))
+    return cache.load(filename, process)
 
-    if not cfg:
-        raise RuntimeError("failed to read yaml config: " + filename)
+def process(cfg):
+    '''Convert plots list into dictionary'''
 
     # Remove all unused objects
     #
-    for key in set(cfg.keys()) - set(["plot", ]):
+    for key in set(cfg.keys()) - set(["plot", "cutflow"]):
         cfg.pop(key)
 
     # Convert inputs and channels from list to dictionary: keys are input names
     #
     plots_ = {}
+    names = []
     for list_ in cfg["plot"]:
         name = list_.pop("name")
         plots_[name] = list_
+        names.append(name)
 
     cfg["plot"] = plots_
 
+    # Plots are styled many times: resolve these with precompiled lookup
+    #
+    cfg["resolver"] = Resolver(plots_, names)
+
+    # Convert cutflow fields into ordered dictionary: keys are field names and
+    # values are cut positions on the cutflow plot x-axis
+    #
+    if cfg.get("cutflow"):
+        cfg["cutflow"] = collections.OrderedDict(
+                (field["name"], field["x"]) for field in cfg["cutflow"])
+
     return cfg
 
+def resolver(config):
+    '''
+    Get plot resolver of the configuration: it is built once and stored in
+    the config under resolver key
+    '''
+
+    resolver_ = config.get("resolver")
+    if resolver_ is None:
+        resolver_ = config["resolver"] = Resolver(config["plot"])
+
+    return resolver_
+
+class Resolver(object):
+    '''
+    Map loaded plot paths into plot configuration
+
+    Plot is looked up by its path first. Plots in folders with suffix, e.g.
+    /Electron_Chi2sel/pt, fall back to the folder without suffix: /Electron/pt.
+    Configuration names may have the same wildcards as plot patterns (see
+    template.loader.InputLoader): wildcard entries are matched in the
+    configuration order if exact name is not found.
+
+    The result is a list of axes tuples: (axis, rebin, title, range) with
+    axis being empty string for 1D plots or x and y for 2D ones and title
+    including units, e.g.:
+
+        [("", 2, "p_{T} [GeV/c]", [0, 100])]
+
+    Each path is resolved only once: the result is re-used for all channels
+    '''
+
+    def __init__(self, plots, order=None):
+        '''
+        Initialize with dictionary of plots configurations; wildcards are
+        matched in the order of names if given or sorted otherwise
+        '''
+
+        self._plots = plots
+        self._wildcards = [(re.compile("^" + translate(name) + "$"), name)
+                           for name in (order or sorted(plots.keys()))
+                           if re.search(r"[*?\[{]", name)]
+
+        self._resolved = {}
+
+    def get(self, path):
+        '''Get axes of the plot or None if plot is not configured'''
+
+        try:
+            return self._resolved[path]
+        except KeyError:
+            axes = self._resolved[path] = self._resolve(path)
+
+            return axes
+
+    @staticmethod
+    def fallback(path):
+        '''
+        Fallback name of the plot: suffix of the top folder is removed and
+        only the next level is kept, e.g.: /Electron_Chi2sel/pt ->
+        /Electron/pt. None is returned for shallow paths, e.g. /npv
+        '''
+
+        levels = path.split('/')
+        if 3 > len(levels):
+            return None
+
+        return '/'.join(('', levels[1].split('_')[0], levels[2]))
+
+    def _resolve(self, path):
+        '''Find plot configuration and compile it into axes'''
+
+        names = [name for name in (path, self.fallback(path)) if name]
+
+        cfg = next((self._plots[name] for name in names
+                    if name in self._plots), None)
+        if cfg is None:
+            cfg = next((self._plots[name]
+                        for path_ in names
+                        for regex, name in self._wildcards
+                        if regex.match(path_)), None)
+
+        if cfg is None:
+            return None
+
+        return [(axis,
+                 cfg.get(axis + "rebin"),
+                 (("{0} [{1}]" if cfg.get(axis + "units") else "{0}").format(
+                         cfg.get(axis + "title"), cfg.get(axis + "units"))
+                  if cfg.get(axis + "title") else None),
+                 cfg.get(axis + "range"))
+                for axis in (("", ) if "rebin" in cfg else ("x", "y"))]
+
 if "__main__" == __name__:
     import sys
 
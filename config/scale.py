@@ -8,8 +8,8 @@ Copyright 2012, All rights reserved
 from __future__ import print_function
 
 import os
-import yaml
 
+import cache
 import channel
 
 def load(filename, config):
@@ -20,12 +20,8 @@ def load(filename, config):
     if not os.path.exists(filename):
         raise RuntimeError("yaml scales file does not exist: " + filename)
 
-    scales = None
-    with open(filename) as input_:
-        scales = yaml.load('\n'.join(input_.readlines()))
-
-    if not scales:
-        raise RuntimeError("failed to read yaml scales: " + filename)
+    # scales are cached as is: these depend on channel config
+    scales = cache.load(filename)
 
     # Expand all channel abbreviations
     scales_ = {}
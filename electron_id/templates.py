@@ -22,6 +22,26 @@ class ElectronIDEfficiency(templates.Templates):
 
         self._legend_valign = "bottom"
 
+    def render_groups(self):
+        '''
+        Group electron ID plots with the no-ID plot they are divided by. The
+        no-ID plots without electron ID plots are not drawn
+        '''
+
+        groups = []
+        for key_ in sorted(self.plots.keys()):
+            if not key_.startswith("/el_no_id"):
+                continue
+
+            plot_suffix = '/' + key_.rsplit('/', 1)[1]
+            el_ids = [id_ for id_ in self.plots.keys()
+                      if (id_.startswith("/el_id_") and
+                          id_.endswith(plot_suffix))]
+            if el_ids:
+                groups.append([key_] + el_ids)
+
+        return groups
+
     def plot(self):
         ''' Process loaded histograms and draw these '''
 
@@ -35,8 +55,6 @@ class ElectronIDEfficiency(templates.Templates):
         if not electron_ids:
             raise RuntimeError("/el_id_?/* plots are not loaded")
 
-        canvases = []
-
         el_id_style = {
             "el_id_0": {
                 "name": "VeryLoose",
@@ -116,12 +134,12 @@ class ElectronIDEfficiency(templates.Templates):
                 if not stack.GetHists():
                     continue
 
-                canvas = self.draw_canvas(channel_, signal=stack, legend=legend,
+                # canvas name should be unique for every plot and channel
+                canvas = self.draw_canvas(channel_ + '_' + plot_suffix,
+                                          signal=stack, legend=legend,
                                           data=None, uncertainty=False)
                 if canvas:
-                    canvases.append(canvas)
-
-        return canvases
+                    yield canvas
 
     def draw(self, background=None, uncertainty=None, data=None, signal=None):
         ''' Let sub-classes redefine how each template should be drawn '''
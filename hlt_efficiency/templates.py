@@ -22,11 +22,14 @@ class Efficiency(templates.Templates):
         self._legend_align = "left"
         self._legend_valign = "bottom"
 
+    def render_groups(self):
+        '''Efficiency combines several plots in each canvas: draw serially'''
+
+        return None
+
     def plot(self):
         ''' Process loaded histograms and draw these '''
 
-        canvases = []
-
         # extract channels
         electron_ref = self.plots["/electron_ref/pt"]
         electron_ref_test = self.plots["/electron_ref_test/pt"]
@@ -81,9 +84,7 @@ class Efficiency(templates.Templates):
                             is_data=("data" == channel),
                             functions=(fit_function,))
             if canvas:
-                canvases.append(canvas)
-
-        return canvases
+                yield canvas
 
     def draw_efficiency_canvases(self, plot_name,
                                  axis, efficiencies,
@@ -172,8 +173,6 @@ class Validation(Efficiency):
     def plot(self):
         ''' Process loaded histograms and draw these '''
 
-        canvases = []
-
         # extract channels
         electron = self.plots["/electron/pt"]
         electron_test = self.plots["/electron_test/pt"]
@@ -215,9 +214,7 @@ class Validation(Efficiency):
                             is_data=("data" == channel))
 
             if canvas:
-                canvases.append(canvas)
-
-        return canvases
+                yield canvas
 
     def draw(self, background=None, uncertainty=None, data=None, signal=None):
         ''' Let sub-classes redefine how each template should be drawn '''
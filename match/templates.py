@@ -26,7 +26,6 @@ class Templates(templates.Templates):
     def plot(self):
         ''' Process loaded histograms and draw these '''
 
-        canvases = []
         for plot, channels in self.plots.items():
             signal = ROOT.THStack()
             background_ = ROOT.THStack()
@@ -79,9 +78,7 @@ class Templates(templates.Templates):
                                       background=background_,
                                       legend=legend, uncertainty=False)
             if canvas:
-                canvases.append(canvas)
-
-        return canvases
+                yield canvas
 
     def draw(self, background=None, uncertainty=None, data=None, signal=None):
         ''' Draw background and signal only '''
@@ -108,7 +105,6 @@ class DRTemplates(templates.Templates):
         put data into Stack, conbine signals, etc.
         '''
 
-        canvases = []
         bg_channels = set(["mc", "qcd"])
         channel.expand(self._channel_config, bg_channels)
 
@@ -163,9 +159,7 @@ class DRTemplates(templates.Templates):
                                       data=data, legend=legend,
                                       uncertainty=False)
             if canvas:
-                canvases.append(canvas)
-
-        return canvases
+                yield canvas
 
     def draw(self, background=None, uncertainty=None, data=None, signal=None):
         ''' Let sub-classes redefine how each template should be drawn '''
@@ -27,7 +27,13 @@ def main():
         opt_parser.remove_option("-s")
         opt_parser.add_option("--mode",
                               action="store", default="text",
-                              help="print output in one of the formats: text, tex")
+                              help=("print output in one of the formats: "
+                                    "text, tex, csv"))
+        opt_parser.add_option("--prefixes",
+                              action="store", default=None,
+                              help=("colon separated file prefixes: cutflow "
+                                    "tables are printed for each prefix, "
+                                    "e.g.: el.0btag:el.1btag"))
         opt_parser.add_option("--non-threshold",
                               action='store_true', default=False,
                               help="print non-threshold cutflow")
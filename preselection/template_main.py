@@ -22,7 +22,19 @@ def main():
 
         opt_parser.add_option("--tff-input", action='store',
                               default=None,
-                              help='run TFractionFitter on specific plot')
+                              help=('run TFractionFitter on specific plot; '
+                                    'colon separated plots are fitted '
+                                    'in scan mode'))
+
+        opt_parser.add_option("--tff-apply", action="store", default=None,
+                              help=("apply scales of this fit variable in "
+                                    "scan mode (first variable by default)"))
+
+        opt_parser.add_option("--fitter", action="store", default="tff",
+                              help=("QCD normalization fitter: tff "
+                                    "(TFractionFitter), poisson (binned "
+                                    "likelihood) or poisson-bb (likelihood "
+                                    "with templates statistics)"))
 
         options, args = opt_parser.parse_args()
 
@@ -7,14 +7,20 @@ Copyright 2012, All rights reserved
 
 from __future__ import print_function, division
 
+import csv
+import itertools
+import json
 import math
+import multiprocessing
 import os
 import sys
 
+import numpy
 import ROOT
 
 from config import channel
-from root import stats
+from root import fraction, stats
+from root.hist import Hist, total
 from template import templates
 
 def efficiency(pass_, total_):
@@ -29,26 +35,49 @@ def efficiency(pass_, total_):
 
     return (a / b, (b * sa - a * sb) / b ** 2)
 
-def cutflow(hist):
+# cutflow fields and their positions on the cutflow plot x-axis; these are
+# used if the plot configuration does not have cutflow section
+CUTFLOW_FIELDS = (("jets", 5),
+                  ("electron", 6),
+                  ("veto_lepton", 8),
+                  ("twod_cut", 9),
+                  ("jet1", 10),
+                  ("htlep", 14),
+                  ("tricut", 15),
+                  ("met", 16),
+                  ("chi2", 19),
+                  ("non_threshold", 20))
+
+# fields the non-threshold efficiency is calculated from: these are printed
+# only with the efficiency
+NON_THRESHOLD_FIELDS = ("chi2", "non_threshold")
+
+# number of fields in one text or TeX table
+TABLE_WIDTH = 4
+
+def cutflow(hist, fields=CUTFLOW_FIELDS):
+    '''
+    Extract cutflow from plot: fields is a sequence of (name, x) pairs with x
+    being the cut position on the plot x-axis. The plot is either ROOT
+    histogram or Hist. Dictionary {name: (content, error)} is returned
+    '''
+
     if not hist:
         return None
 
-    def stats_(hist, x_):
-        bin_ = hist.FindBin(x_)
+    if not isinstance(hist, Hist):
+        hist = Hist.from_th1(hist)
+
+    names = [name for name, x_ in fields]
 
-        return (hist.GetBinContent(bin_), hist.GetBinError(bin_))
+    # the same cells as TH1::FindBin: 0 is underflow and N + 1 is overflow
+    cells = numpy.searchsorted(hist.edges(),
+                               numpy.array([x_ for name, x_ in fields],
+                                           dtype='d'),
+                               side="right")
 
-    return {"jets": stats_(hist, 5),
-            "electron": stats_(hist, 6),
-            "veto_lepton": stats_(hist, 8),
-            "twod_cut": stats_(hist, 9),
-            "jet1": stats_(hist, 10),
-            "htlep": stats_(hist, 14),
-            "tricut": stats_(hist, 15),
-            "met": stats_(hist, 16),
-            "chi2": stats_(hist, 19),
-            "non_threshold": stats_(hist, 20)
-            }
+    return dict(zip(names, zip(hist.contents[cells].tolist(),
+                               hist.errors[cells].tolist())))
 
 def format_stats(stats, sep="+-", is_header=False, is_efficiency=False):
     if is_header:
@@ -58,10 +87,7 @@ def format_stats(stats, sep="+-", is_header=False, is_efficiency=False):
     else:
         return "{0:>8.0f} {sep} {1:<5.0f}".format(*stats, sep=sep)
 
-def print_cutflow_in_text(channel, cutflow,
-                          fields=["jets", "electron", "veto_lepton",
-                                  "twod_cut", "jet1", "htlep", "tricut",
-                                  "met"]):
+def print_cutflow_in_text(channel, cutflow, fields):
     cells = ["{0:>20}".format(channel if channel else "Channel"), ]
     for field_ in fields:
         if channel:
@@ -79,10 +105,7 @@ def print_cutflow_in_text(channel, cutflow,
         print(*new_cells, sep=" + ")
 
 
-def print_cutflow_in_tex(channel, cutflow,
-                         fields=["jets", "electron", "veto_lepton",
-                                 "twod_cut", "jet1", "htlep", "tricut",
-                                 "met"]):
+def print_cutflow_in_tex(channel, cutflow, fields):
     if not channel:
         return
 
@@ -91,6 +114,22 @@ def print_cutflow_in_tex(channel, cutflow,
         cells.append(format_stats(cutflow[field_], sep="&"))
     print(*cells, sep=" & ", end=" \\\\\n")
 
+def print_cutflow_in_csv(prefix, channel, cutflow, fields):
+    '''
+    Print cutflow row in CSV format: prefix, channel and value with error for
+    each field. Header is printed if channel is None
+    '''
+
+    writer = csv.writer(sys.stdout, lineterminator='\n')
+    if not channel:
+        writer.writerow(["prefix", "channel"] +
+                        list(itertools.chain.from_iterable(
+                            (field_, field_ + "_error") for field_ in fields)))
+    else:
+        writer.writerow([prefix, channel] +
+                        list(itertools.chain.from_iterable(
+                            cutflow.get(field_, ("", "")) for field_ in fields)))
+
 class Cutflow(templates.Templates):
     ''' Produce S / B plot '''
 
@@ -98,14 +137,83 @@ class Cutflow(templates.Templates):
         templates.Templates.__init__(self, options, args, config)
 
         self._print_mode = options.mode
+        if self._print_mode not in ("text", "tex", "csv"):
+            raise RuntimeError("unsupported print mode: " + self._print_mode)
+
         self._non_threshold = options.non_threshold
 
-    def plot(self):
-        ''' Process loaded histograms and draw these '''
+        # cutflow tables are produced for each prefix in one run: the first
+        # one replaces --prefix
+        self._prefixes = (options.prefixes.split(':') if options.prefixes
+                          else [self._prefix, ])
+
+        self._prefix = self._prefixes[0]
+        if self._index:
+            self._index = "{0}.index.json".format(self._prefix)
+
+        if 1 < len(self._prefixes) and (self._export or self._import):
+            raise RuntimeError("plots of several prefixes can not be "
+                               "exported or imported")
+
+        fields = self._plot_config.get("cutflow")
+        self._fields = (tuple(fields.items()) if fields
+                        else CUTFLOW_FIELDS)
+
+        # list of (prefix, cutflows) filled on load
+        self._cutflows = []
+
+    def render_groups(self):
+        '''Cutflow is printed and not drawn: nothing to parallelize'''
+
+        return None
+
+    def load(self):
+        '''
+        Load cutflow plot for each prefix and extract cutflows. Worker
+        processes, inputs cache and configurations are shared among all
+        prefixes; plots are released as soon as cutflows are extracted
+        '''
+
+        self._cutflows = []
+        if 1 == len(self._prefixes):
+            templates.Templates.load(self)
+            self._cutflows.append((self._prefix, self._extract()))
+
+            return
+
+        pool = multiprocessing.Pool(self._jobs) if 1 < self._jobs else None
+        try:
+            for prefix in self._prefixes:
+                self._prefix = prefix
+                if self._index:
+                    self._index = "{0}.index.json".format(prefix)
+
+                self._plots = {}
+                self._load_channels(pool,
+                                    self._load_index() if self._index
+                                    else None)
+
+                self._cutflows.append((prefix, self._extract()))
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+            self._plots = {}
+
+    def _extract(self):
+        '''
+        Extract cutflows of loaded channels: dictionary with signal and
+        background cutflows per channel, total background and data
+        '''
 
         # the main executable script should make sure only one plot is loaded:
         # /cutflow or /cutflow_no_weight
-        channels = self.plots[self.plots.keys().pop()]
+        if not self.plots:
+            raise RuntimeError("cutflow plot is not loaded for prefix " +
+                               self._prefix)
+
+        channels = next(iter(self.plots.values()))
 
         signal_channels = set(["zp", "zpwide", "kk"])
         channel.expand(self._channel_config, signal_channels)
@@ -115,21 +223,63 @@ class Cutflow(templates.Templates):
 
         signal_ = {}
         background_ = {}
-        total_background_ = None
         data_ = None
-        for channel_, hist in channels.items():
+        for channel_, hist_ in channels.items():
             if channel_ in signal_channels:
-                signal_[channel_] = cutflow(hist)
+                signal_[channel_] = cutflow(hist_, self._fields)
             elif channel_ in background_channels:
-                background_[channel_] = cutflow(hist)
-                if not total_background_:
-                    total_background_ = hist.Clone()
-                else:
-                    total_background_.Add(hist)
+                background_[channel_] = cutflow(hist_, self._fields)
             elif channel_ == "data":
-                data_ = cutflow(hist)
+                data_ = cutflow(hist_, self._fields)
+
+        total_background_ = cutflow(
+                total(hist_ for channel_, hist_ in channels.items()
+                      if channel_ in background_channels),
+                self._fields)
+
+        if self._non_threshold:
+            for cutflow_ in itertools.chain(signal_.values(),
+                                            background_.values(),
+                                            (total_background_, data_)):
+                if not cutflow_:
+                    continue
+
+                cutflow_["eff"] = efficiency(cutflow_.get("non_threshold", 0),
+                                             cutflow_.get("chi2", 0))
 
-        total_background_ = cutflow(total_background_)
+        return {"signal": signal_,
+                "background": background_,
+                "total": total_background_,
+                "data": data_}
+
+    def _rows(self, cutflows):
+        '''Table rows: (channel, cutflow) in the order of printing'''
+
+        rows = []
+        for channel_ in self._channel_config["order"]:
+            if (not channel_.startswith("zprime") or
+                channel_ not in cutflows["signal"]):
+
+                continue
+
+            rows.append((channel_, cutflows["signal"][channel_]))
+
+        for channel_ in ["stop", "zjets", "wb", 'wc', 'wlight', "ttbar"]:
+            if channel_ not in cutflows["background"]:
+                continue
+
+            rows.append((channel_, cutflows["background"][channel_]))
+
+        if cutflows["total"]:
+            rows.append(("Total MC", cutflows["total"]))
+
+        if cutflows["data"]:
+            rows.append(("Data 2011", cutflows["data"]))
+
+        return rows
+
+    def plot(self):
+        ''' Process loaded histograms and draw these '''
 
         channel_names = {
                 "zprime_m1000_w10": r"Z' 1 Tev/c\textsuperscript{2}",
@@ -142,7 +292,7 @@ class Cutflow(templates.Templates):
                 "wc": r"$W\rightarrow l\nu$ (cX)",
                 "wlight": r"$W\rightarrow l\nu$ (lightX)",
                 "ttbar": r"QCD $t\bar{t}$",
-                } if "text" != self._print_mode else {
+                } if "tex" == self._print_mode else {
                 "zprime_m1000_w10": r"Z' 1 Tev",
                 "zprime_m2000_w20": r"Z' 2 Tev",
                 "zprime_m3000_w30": r"Z' 3 Tev",
@@ -155,65 +305,141 @@ class Cutflow(templates.Templates):
                 "ttbar": r"QCD ttbar",
                 }
 
+        if "csv" == self._print_mode:
+            # one table with all fields of all prefixes
+            fields = [name for name, x_ in self._fields]
+            if self._non_threshold:
+                fields.append("eff")
+
+            print_cutflow_in_csv(None, None, None, fields)
+            for prefix, cutflows in self._cutflows:
+                for channel_, cutflow_ in self._rows(cutflows):
+                    print_cutflow_in_csv(prefix,
+                                         channel_names.get(channel_, channel_),
+                                         cutflow_, fields)
+
+            return None
+
         print_function = (print_cutflow_in_text
                           if self._print_mode == "text"
                           else print_cutflow_in_tex)
 
-        fields_to_print = [["jets", "electron", "veto_lepton", "twod_cut"],
-                           ["jet1", "htlep", "tricut", "met"]]
+        # configured fields are split into tables of fixed width; the
+        # efficiency inputs are printed in a separate table with it
+        fields = [name for name, x_ in self._fields
+                  if name not in NON_THRESHOLD_FIELDS]
+        fields_to_print = [fields[start:start + TABLE_WIDTH]
+                           for start in range(0, len(fields), TABLE_WIDTH)]
         if self._non_threshold:
-            fields_to_print.append(["chi2", "non_threshold", "eff"])
-            for samples_cutflow_ in (signal_, background_):
-                if not samples_cutflow_:
-                    continue
+            fields_to_print.append([name for name, x_ in self._fields
+                                    if name in NON_THRESHOLD_FIELDS] +
+                                   ["eff"])
 
-                for channel_, cutflow_ in samples_cutflow_.items():
-                    cutflow_["eff"] = efficiency(cutflow_.get("non_threshold", 0),
-                                                 cutflow_.get("chi2", 0))
+        for prefix, cutflows in self._cutflows:
+            if 1 < len(self._cutflows):
+                print("{0:-<80}".format("-- " + prefix + ' '))
 
-            for cutflow_ in (total_background_, data_):
-                    cutflow_["eff"] = efficiency(cutflow_.get("non_threshold", 0),
-                                                 cutflow_.get("chi2", 0))
+            rows = self._rows(cutflows)
+            for fields in fields_to_print:
+                print_function(None, None, fields)
 
-        for fields in fields_to_print:
-            print_function(None, None, fields)
+                for channel_, cutflow_ in rows:
+                    print_function(channel_names.get(channel_, channel_),
+                                   cutflow_, fields)
 
-            for channel_ in self._channel_config["order"]:
-                if (not channel_.startswith("zprime") or
-                    channel_ not in signal_):
+                print()
 
-                        continue
+        return None
 
-                print_function(channel_names.get(channel_, channel_),
-                               signal_[channel_], fields)
+def _fit(task):
+    '''
+    Fit data with MC and QCD templates: task is a tuple of fitter name and
+    dictionary of data, mc and qcd Hist objects. Fractions and relative
+    fraction errors are returned. The function may be run in worker process
+    '''
+
+    fitter_name, met = task
+
+    if "tff" == fitter_name:
+        # prepare variable tempaltes for TFractionFitter
+        hists = dict((key, hist_.to_th1()) for key, hist_ in met.items())
+
+        templates_ = ROOT.TObjArray(2)
+        templates_.Add(hists["mc"])
+        templates_.Add(hists["qcd"])
+
+        # Setup TFractionFitter
+        fitter = ROOT.TFractionFitter(hists["data"], templates_)
+
+        # Run TFRactionFitter
+        fit_status = fitter.Fit()
+        if fit_status:
+            raise RuntimeError("fitter error {0}".format(fit_status))
+
+        # Extract MC and QCD fractions from TFractionFitter
+        fraction_ = ROOT.Double(0)
+        fraction_error = ROOT.Double(0)
+        fractions = {}
+        fraction_errors = {}
+        for index, key in enumerate(("mc", "qcd")):
+            fitter.GetResult(index, fraction_, fraction_error)
+            fractions[key] = float(fraction_)
+            fraction_errors[key] = float(fraction_error)
+    else:
+        result = fraction.fit(met["data"], (met["mc"], met["qcd"]),
+                              barlow_beeston=("poisson-bb" == fitter_name))
 
-            for channel_ in ["stop", "zjets", "wb", 'wc', 'wlight', "ttbar"]:
-                if channel_ not in background_:
-                    continue
+        fractions = dict(zip(("mc", "qcd"),
+                             (float(x) for x in result["fractions"])))
+        fraction_errors = dict(zip(("mc", "qcd"),
+                                   (float(x)
+                                    for x in result["fraction_errors"])))
 
-                print_function(channel_names.get(channel_, channel_),
-                               background_[channel_], fields)
+    # relative errors are used for scales
+    for key, value in fractions.items():
+        if not value:
+            raise RuntimeError("zero {0} fraction is fitted".format(
+                               key.upper()))
 
-            print_function("Total MC", total_background_, fields)
+        fraction_errors[key] /= value
 
-            if data_:
-                print_function("Data 2011", data_, fields)
+    return fractions, fraction_errors
 
-            print()
+def _safe_fit(task):
+    '''Run fit and return error message instead of raising exception'''
 
-        return None
+    try:
+        return _fit(task)
+    except RuntimeError as error:
+        return str(error)
 
 class Templates(templates.Templates):
+    # supported fitters: TFractionFitter or binned Poisson likelihood fit
+    # without and with templates statistics (Barlow-Beeston-lite)
+    fitters = ("tff", "poisson", "poisson-bb")
+
     def __init__(self, options, args, config):
         
-        self._tff_input = options.tff_input or os.getenv("EXO_PLOT_TFF_INPUT",
-                                                         '/Event/MET')
-        options.plots = options.plots + ':%s' % self._tff_input
+        # colon separated fit variables: all of these are fitted and scales of
+        # the chosen one are applied
+        self._tff_inputs = (options.tff_input or
+                            os.getenv("EXO_PLOT_TFF_INPUT",
+                                      '/Event/MET')).split(':')
+
+        self._tff_input = options.tff_apply or self._tff_inputs[0]
+        if self._tff_input not in self._tff_inputs:
+            raise RuntimeError("scales are applied from not fitted variable: " +
+                               self._tff_input)
+
+        options.plots = options.plots + ':' + ':'.join(self._tff_inputs)
         
         templates.Templates.__init__(self, options, args, config)
 
         self._label = options.label or os.getenv("EXO_PLOT_LABEL", None)
 
+        self._fitter = options.fitter
+        if self._fitter not in self.fitters:
+            raise RuntimeError("unsupported fitter: " + self._fitter)
 
     def load(self):
         # Run default loading
@@ -224,107 +450,37 @@ class Templates(templates.Templates):
             if self._verbose:
                 print("{0:-<80}".format("-- TFractionFitter "))
 
-            if (self._tff_input not in self.plots):
-                raise RuntimeError("load plot " + self._tff_input)
-
-            # Extract met DATA, QCD and MC
-            met = {}
             mc_channels = set(["mc", ])
             channel.expand(self._channel_config, mc_channels)
-            for channel_, plot_ in self.plots[self._tff_input].items():
-                if "data" == channel_:
-                    met["data"] = plot_
-                elif "qcd" == channel_:
-                    met["qcd"] = plot_
-                elif channel_ in mc_channels:
-                    if "mc" in met:
-                        met["mc"].Add(plot_)
-                    else:
-                        met["mc"] = plot_.Clone()
-
-            print (met.keys())
-
-            missing_channels = set(["data", "qcd", "mc"]) - set(met.keys())
-            if missing_channels:
-                raise RuntimeError("channels {0!r} are not loaded".format(
-                                    missing_channels))
-
-            # prepare variable tempaltes for TFractionFitter
-            templates_ = ROOT.TObjArray(2)
-            templates_.Add(met['mc'])
-            templates_.Add(met["qcd"])
-
-            # Setup TFractionFitter
-            fitter = ROOT.TFractionFitter(met["data"], templates_)
-
-            # Run TFRactionFitter
-            fit_status = fitter.Fit()
-            if fit_status:
-                raise RuntimeError("fitter error {0}".format(fit_status))
-
-            # Extract MC and QCD scales from TFractionFitter and keep
-            # only central values (drop errors)
-            fraction = ROOT.Double(0)
-            fraction_error = ROOT.Double(0)
-            fractions = {}
-            fraction_errors = {}
-            scales = {}
-            scale_errors = {}
-
-            data_integral_ = met["data"].Integral(0,met["data"].GetNbinsX()+1)
-            qcd_integral_ = met["qcd"].Integral(0,met["qcd"].GetNbinsX()+1)
-            mc_integral_ = met["mc"].Integral(0,met["mc"].GetNbinsX()+1)
-
-            mc_integral_error_ = 0.0
-            for i in range(0,met["mc"].GetNbinsX()+2):
-                mc_integral_error_ = mc_integral_error_ + met["mc"].GetBinError(i)**2
-            mc_integral_error_ = math.sqrt(mc_integral_error_) / mc_integral_
-
-            fitter.GetResult(0, fraction, fraction_error)
-            fractions["mc"] = float(fraction)
-            fraction_errors["mc"] = float(fraction_error) / float(fraction)
-            scales["mc"] = float(fraction) * data_integral_ / mc_integral_
-            scale_errors["mc"] = math.sqrt(
-                (1/data_integral_) + mc_integral_error_**2 + fraction_errors["mc"]**2
-            )
 
-            fitter.GetResult(1, fraction, fraction_error)
-            fractions["qcd"] = float(fraction)
-            fraction_errors["qcd"] = float(fraction_error) / float(fraction)
-            scales["qcd"] = float(fraction) * data_integral_ / qcd_integral_
-            scale_errors["qcd"] = math.sqrt(
-                (1/data_integral_) + mc_integral_error_**2 + fraction_errors["qcd"]**2
-            )
+            results = self._fit_all(mc_channels)
+            if 1 < len(results) or self._verbose:
+                self._print_scan(results)
+
+            result = results[self._tff_input]
+            if not isinstance(result, dict):
+                raise RuntimeError(result)
+
+            scales = result["scales"]
 
             # Print found fractions
             if self._verbose:
+                print("apply", self._tff_input, "scales")
                 print('\n'.join("{0:>3} fraction: {1:.3f} +- {2:.1f}%".format(key.upper(),
-                                                                  value, 100*fraction_errors[key])
-                                for key, value in fractions.items()))
+                                                                  value, 100*result["fraction_errors"][key])
+                                for key, value in result["fractions"].items()))
                 print('\n'.join("{0:>3} scale: {1:.3f} +- {2:.1f}%".format(key.upper(),
-                                                                  value, 100*scale_errors[key])
+                                                                  value, 100*result["scale_errors"][key])
                                 for key, value in scales.items()))
 
-            # Scale all MC and QCD samples with fractions
+            # Scale all MC and QCD samples with fractions in one pass
             for plot_, channels_ in self.plots.items():
                 # Skip normalization if one of the channels is missing
                 if ("data" not in channels_ or 
-                    "qcd" not in channels_):
+                    "qcd" not in channels_ or
+                    not mc_channels.intersection(channels_)):
                     continue
 
-                # Get MC sum
-                mc_sum_ = None
-                for channel_, hist_ in channels_.items():
-                    if channel_ in mc_channels:
-                        if mc_sum_:
-                            mc_sum_.Add(hist_)
-                        else:
-                            mc_sum_ = hist_.Clone()
-
-                if not mc_sum_:
-                    continue
-
-                data_integral_ = channels_["data"].Integral()
                 for channel_, hist_ in channels_.items():
                     if channel_ in mc_channels:
                         hist_.Scale(scales["mc"])
@@ -339,3 +495,162 @@ class Templates(templates.Templates):
         finally:
             if self._verbose:
                 print()
+
+    def _fit_inputs(self, variable, mc_channels):
+        '''Extract DATA, QCD and MC sum of the fit variable as arrays'''
+
+        if variable not in self.plots:
+            raise RuntimeError("load plot " + variable)
+
+        met = {}
+        plots_ = self.plots[variable]
+        for channel_ in ("data", "qcd"):
+            if channel_ in plots_:
+                met[channel_] = Hist.from_th1(plots_[channel_])
+
+        mc_ = total(plot_ for channel_, plot_ in plots_.items()
+                    if channel_ in mc_channels)
+        if mc_:
+            met["mc"] = mc_
+
+        missing_channels = set(["data", "qcd", "mc"]) - set(met.keys())
+        if missing_channels:
+            raise RuntimeError("channels {0!r} are not loaded".format(
+                                missing_channels))
+
+        return met
+
+    def _fit_all(self, mc_channels):
+        '''
+        Fit all variables, the fits are run in worker processes if more than
+        one job is requested. Dictionary with results is returned for every
+        variable: fractions, scales and their relative errors, or error
+        message if fit failed. The results are cached per fit inputs
+        '''
+
+        results = {}
+        inputs = {}
+        tasks = []
+        for variable in self._tff_inputs:
+            try:
+                met = self._fit_inputs(variable, mc_channels)
+            except RuntimeError as error:
+                results[variable] = str(error)
+
+                continue
+
+            inputs[variable] = met
+
+            cached = self._cached_fit(met)
+            if cached:
+                results[variable] = cached
+            else:
+                tasks.append(variable)
+
+        fit_tasks = [(self._fitter, inputs[variable]) for variable in tasks]
+        if 1 < self._jobs and 1 < len(fit_tasks):
+            pool = multiprocessing.Pool(min(self._jobs, len(fit_tasks)))
+            try:
+                fits = pool.map(_safe_fit, fit_tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            fits = [_safe_fit(task) for task in fit_tasks]
+
+        for variable, fit in zip(tasks, fits):
+            results[variable] = fit
+            if isinstance(fit, tuple):
+                self._cache_fit(inputs[variable], fit)
+
+        for variable, result in results.items():
+            if isinstance(result, tuple):
+                results[variable] = self._scales(inputs[variable], *result)
+
+        return results
+
+    def _scales(self, met, fractions, fraction_errors):
+        '''Convert fractions into MC and QCD scales'''
+
+        # integrals include under- and overflow bins
+        data_integral_ = float(met["data"].contents.sum())
+        mc_integral_ = float(met["mc"].contents.sum())
+        mc_integral_error_ = (math.sqrt(met["mc"].variances.sum()) /
+                              mc_integral_)
+
+        scales = {}
+        scale_errors = {}
+        for key in ("mc", "qcd"):
+            scales[key] = (fractions[key] * data_integral_ /
+                           float(met[key].contents.sum()))
+            scale_errors[key] = math.sqrt(
+                (1/data_integral_) + mc_integral_error_**2 + fraction_errors[key]**2
+            )
+
+        return {"fractions": fractions,
+                "fraction_errors": fraction_errors,
+                "scales": scales,
+                "scale_errors": scale_errors}
+
+    def _cache_filename(self, met):
+        '''Cached fit filename or None if cache is not used'''
+
+        if not self._cache:
+            return None
+
+        key = fraction.key(met["data"], (met["mc"], met["qcd"]), self._fitter)
+
+        return os.path.join(self._cache.path, "fraction", key + ".json")
+
+    def _cached_fit(self, met):
+        '''Get cached fractions and errors or None'''
+
+        filename = self._cache_filename(met)
+        if not filename or not os.path.exists(filename):
+            return None
+
+        with open(filename) as input_:
+            result = json.load(input_)
+
+        if self._verbose:
+            print("use cached fit result", filename)
+
+        return result["fractions"], result["fraction_errors"]
+
+    def _cache_fit(self, met, fit):
+        '''Store fractions and errors in cache'''
+
+        filename = self._cache_filename(met)
+        if not filename:
+            return
+
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+
+        with open(filename, 'w') as output_:
+            json.dump({"fractions": fit[0], "fraction_errors": fit[1]},
+                      output_)
+
+    def _print_scan(self, results):
+        '''Print fractions and scales of every fit variable'''
+
+        print("{0:<35} {1:>17} {2:>17} {3:>15} {4:>15}".format(
+              "variable", "MC fraction", "QCD fraction", "MC scale",
+              "QCD scale"))
+
+        for variable in self._tff_inputs:
+            result = results[variable]
+            name = ("* " if variable == self._tff_input else "  ") + variable
+            if not isinstance(result, dict):
+                print("{0:<35} failed: {1}".format(name, result))
+
+                continue
+
+            print("{0:<35} {1:>17} {2:>17} {3:>15} {4:>15}".format(
+                  name,
+                  *(["{0:.3f} +- {1:.1f}%".format(result["fractions"][key],
+                                                  100 * result["fraction_errors"][key])
+                     for key in ("mc", "qcd")] +
+                    ["{0:.3f} +- {1:.1f}%".format(result["scales"][key],
+                                                  100 * result["scale_errors"][key])
+                     for key in ("mc", "qcd")])))
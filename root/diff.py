@@ -5,48 +5,49 @@ Created by Samvel Khalatyan, May 16, 2012
 Copyright 2012, All rights reserved
 '''
 
-from __future__ import print_function
+from __future__ import division, print_function
 
+import hashlib
+import json
 import os
 import sys
 
+import numpy
+import ROOT
+
 import root.tfile
+from root.hist import Hist
 
-def diff(lfile, rfile, verbose=True):
+def diff(lfile, rfile, verbose=True, plot_patterns=[]):
     '''
     Compare two ROOT file keys and report if files are different
 
-    The content is compared only at the top level. No histogram equality is
-    checked.
+    The content is compared recursively by paths only: no objects are read
+    and no histogram equality is checked. Paths may be limited with plot
+    patterns, the same as in template.loader.InputLoader. Folders that
+    exist in one file only are reported as one path.
 
     Example:
 
         diff("file1.root", "file2.root")
+        diff("file1.root", "file2.root", plot_patterns=["/jet?/*"])
 
     Function will return list with four items:
 
         [0] True if files are different, False otherwise
-        [1] keys that are exclusive to file1
-        [2] common keys to two files
-        [3] keys that are found only in file2
+        [1] paths that are exclusive to file1
+        [2] common paths to two files
+        [3] paths that are found only in file2
     '''
 
-    # Extract keys from left file
-    lkeys = set()
-    with root.tfile.topen(lfile) as lfile_:
-        # keys are cached and objects are removed once file is closed:
-        # extract the names from cache
-        #
-        lkeys = set(x.GetName() for x in lfile_.GetListOfKeys())
-
-    # Extract keys from right file
-    rkeys = set()
-    with root.tfile.topen(rfile) as rfile_:
-        rkeys = set(x.GetName() for x in rfile_.GetListOfKeys())
+    keys = {"left-only": set(), "common": set(), "right-only": set()}
+    for entry in walk(lfile, rfile, plot_patterns=plot_patterns,
+                      content=False):
+        keys[entry["status"]].add(entry["path"])
 
-    common_keys = lkeys & rkeys
-    lonly_keys = lkeys - common_keys
-    ronly_keys = rkeys - common_keys
+    common_keys = keys["common"]
+    lonly_keys = keys["left-only"]
+    ronly_keys = keys["right-only"]
 
     if verbose and lonly_keys:
         print("keys exlusive to file", lfile)
@@ -60,19 +61,324 @@ def diff(lfile, rfile, verbose=True):
 
     return bool(lonly_keys or ronly_keys), lonly_keys, common_keys, ronly_keys
 
+def _keys(dir_):
+    '''
+    Directory keys: only the highest cycle of each name is used, the same way
+    TDirectory::Get does. Keys are sorted by cycle in the list of keys
+    '''
+
+    keys = {}
+    for key in dir_.GetListOfKeys():
+        keys.setdefault(key.GetName(), key)
+
+    return keys
+
+def _is_dir(key):
+    '''Check if key holds a directory'''
+
+    class_ = ROOT.TClass.GetClass(key.GetClassName())
+
+    return bool(class_) and class_.InheritsFrom("TDirectory")
+
+def _is_hist(key):
+    '''
+    Check if key holds a histogram that can be compared bin by bin: 3D
+    histograms are not supported by Hist and profiles store sums instead of
+    values; these are compared by buffer only
+    '''
+
+    class_ = ROOT.TClass.GetClass(key.GetClassName())
+
+    return (bool(class_) and class_.InheritsFrom("TH1") and
+            not class_.InheritsFrom("TH3") and
+            not class_.InheritsFrom("TProfile") and
+            not class_.InheritsFrom("TProfile2D"))
+
+def _metadata(key):
+    '''TKey metadata: the object is not read'''
+
+    return {"class": key.GetClassName(),
+            "cycle": key.GetCycle(),
+            "nbytes": key.GetNbytes(),
+            "objlen": key.GetObjlen()}
+
+def _checksum(file_, key):
+    '''
+    MD5 of the object buffer as it is stored in file (compressed). The buffer
+    is read with plain file read: nothing is decompressed or streamed
+    '''
+
+    file_.seek(key.GetSeekKey() + key.GetKeylen())
+
+    return hashlib.md5(file_.read(key.GetNbytes() - key.GetKeylen())).hexdigest()
+
+def _read(key):
+    '''Read the key object and detach it from file'''
 
+    obj = key.ReadObj()
+    if obj and isinstance(obj, ROOT.TH1):
+        obj.SetDirectory(0)
+        ROOT.SetOwnership(obj, True)
+
+    return obj
+
+def compare_hists(lhist, rhist, tolerance=0):
+    '''
+    Compare two histograms bin by bin, under- and overflows included. Bins
+    are equal if the contents and errors differ by no more than tolerance
+    relative to the largest of the two values. The histograms are ROOT ones
+    or Hist objects.
+
+    None is returned if histograms are equal otherwise a dictionary with
+    the difference description
+    '''
+
+    if not isinstance(lhist, Hist):
+        lhist = Hist.from_th1(lhist)
+
+    if not isinstance(rhist, Hist):
+        rhist = Hist.from_th1(rhist)
+
+    if (lhist.dimension != rhist.dimension or
+        lhist.contents.shape != rhist.contents.shape or
+        not all(numpy.allclose(lhist.edges(axis), rhist.edges(axis))
+                for axis in range(lhist.dimension))):
+
+        return {"reason": "binning"}
+
+    different = numpy.zeros(lhist.contents.shape, dtype=bool)
+    result = {"reason": "bins"}
+    for name, lvalues, rvalues in (("contents", lhist.contents,
+                                    rhist.contents),
+                                   ("errors", lhist.errors, rhist.errors)):
+        delta = numpy.abs(lvalues - rvalues)
+        limit = tolerance * numpy.maximum(numpy.abs(lvalues),
+                                          numpy.abs(rvalues))
+
+        different |= delta > limit
+        result["max_" + name + "_difference"] = (float(delta.max())
+                                                 if delta.size else 0.0)
+
+    if not different.any():
+        return None
+
+    result["cells"] = numpy.flatnonzero(different).tolist()
+
+    return result
+
+def walk(lfile, rfile, tolerance=0, plot_patterns=[], content=True):
+    '''
+    Compare two ROOT files recursively in one pass over both files and yield
+    one entry per path. The entries are dictionaries with:
+
+        path    folders and object name, e.g.: /jet1/pt
+        status  one of:
+
+                    left-only   path is found in the first file only
+                    right-only  path is found in the second file only
+                    same        stored objects are identical
+                    equal       stored objects differ (e.g. title or
+                                compression) but histograms are equal
+                                within tolerance
+                    different   objects are different
+                    common      path is found in both files (content is
+                                not compared)
+
+        left    left key metadata: class, cycle, nbytes, objlen and md5
+        right   right key metadata
+
+    Objects are compared by TKey metadata and checksum of the stored buffer
+    first: objects are read only if these differ. Histograms are then
+    compared bin by bin (see compare_hists) and the difference is added to
+    the entry. Common objects get status "common" and nothing is compared if
+    content is False.
+
+    Paths are limited with plot patterns (see template.loader.InputLoader):
+    folders that can not host matching paths are skipped. Folders found in
+    one file only are reported without going inside
+    '''
+
+    # imported here: template package depends on root one
+    from template import loader
+
+    filter_ = loader.InputLoader(plot_patterns)
+    with open(lfile, "rb") as lraw:
+        with open(rfile, "rb") as rraw:
+            with root.tfile.topen(lfile) as lfile_:
+                with root.tfile.topen(rfile) as rfile_:
+                    for entry in _walk(lfile_, rfile_, lraw, rraw, tolerance,
+                                       filter_, content):
+                        yield entry
+
+def _walk(ldir, rdir, lraw, rraw, tolerance, filter_, content, path=''):
+    '''Recursive back-end of the walk'''
+
+    lkeys = _keys(ldir)
+    rkeys = _keys(rdir)
+
+    for name in sorted(set(lkeys) | set(rkeys)):
+        path_ = path + '/' + name
+        lkey = lkeys.get(name)
+        rkey = rkeys.get(name)
+
+        # use any key to decide if path is requested: folders are pruned
+        # before these are read
+        key = lkey or rkey
+        if _is_dir(key):
+            if not filter_.process_dir(path_):
+                continue
+
+        elif not filter_.match(path_):
+            continue
+
+        if not rkey:
+            yield {"path": path_, "status": "left-only",
+                   "left": _metadata(lkey)}
+
+            continue
+
+        if not lkey:
+            yield {"path": path_, "status": "right-only",
+                   "right": _metadata(rkey)}
+
+            continue
+
+        if _is_dir(lkey) and _is_dir(rkey):
+            for entry in _walk(ldir.GetDirectory(name),
+                               rdir.GetDirectory(name),
+                               lraw, rraw, tolerance, filter_, content, path_):
+                yield entry
+
+            continue
+
+        if not content:
+            yield {"path": path_, "status": "common"}
+
+            continue
+
+        entry = {"path": path_,
+                 "left": _metadata(lkey),
+                 "right": _metadata(rkey)}
+
+        if entry["left"]["class"] != entry["right"]["class"]:
+            entry["status"] = "different"
+            entry["reason"] = "class"
+
+            yield entry
+
+            continue
+
+        # buffers of different size can not be the same: skip the checksum
+        if (entry["left"]["objlen"] == entry["right"]["objlen"] and
+            (lkey.GetNbytes() - lkey.GetKeylen() ==
+             rkey.GetNbytes() - rkey.GetKeylen())):
+
+            entry["left"]["md5"] = _checksum(lraw, lkey)
+            entry["right"]["md5"] = _checksum(rraw, rkey)
+
+            if entry["left"]["md5"] == entry["right"]["md5"]:
+                entry["status"] = "same"
+
+                yield entry
+
+                continue
+
+        if not _is_hist(lkey):
+            entry["status"] = "different"
+            entry["reason"] = "buffer"
+
+            yield entry
+
+            continue
+
+        difference = compare_hists(_read(lkey), _read(rkey), tolerance)
+        if difference:
+            entry["status"] = "different"
+            entry.update(difference)
+        else:
+            entry["status"] = "equal"
+
+        yield entry
+
+def compare(lfile, rfile, tolerance=0, verbose=False, plot_patterns=[]):
+    '''
+    Compare two ROOT files recursively (see walk) and return report:
+
+        left        first filename
+        right       second filename
+        tolerance   relative tolerance used for bins comparison
+        different   True if files are different
+        summary     number of entries for each status
+        entries     list of entries that are not the same
+
+    Each difference is printed in verbose mode
+    '''
+
+    summary = dict((status, 0) for status in ("left-only", "right-only",
+                                              "same", "equal", "different"))
+    entries = []
+    for entry in walk(lfile, rfile, tolerance, plot_patterns):
+        summary[entry["status"]] += 1
+        if "same" == entry["status"]:
+            continue
+
+        entries.append(entry)
+        if verbose and "equal" != entry["status"]:
+            print({"left-only": "<",
+                   "right-only": ">",
+                   "different": "!"}[entry["status"]],
+                  entry["path"], entry.get("reason", ""))
+
+    return {"left": lfile,
+            "right": rfile,
+            "tolerance": tolerance,
+            "different": bool(summary["left-only"] or
+                              summary["right-only"] or
+                              summary["different"]),
+            "summary": summary,
+            "entries": entries}
 
 if "__main__" == __name__:
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="usage: %prog [options] file1.root file2.root")
+    parser.add_option("--keys", action="store_true", default=False,
+                      help="compare paths only")
+    parser.add_option("--plots", action="store", default=None,
+                      help=("colon separated plot patterns to compare, "
+                            "e.g.: /jet?/*:/met"))
+    parser.add_option("--tolerance", action="store", type="float", default=0,
+                      help="relative tolerance of bins comparison")
+    parser.add_option("--json", action="store", default=None,
+                      help="save report in JSON file, use - for stdout")
+
+    options, args = parser.parse_args()
+
     try:
-        if len(sys.argv) != 3:
+        if len(args) != 2:
             raise RuntimeError("usage: {0} file1.root file2.root".format(
                                sys.argv[0]))
 
-        for filename in sys.argv[1:]:
+        for filename in args:
             if not os.path.exists(filename):
                 raise RuntimeError("file does not exist " + filename)
 
-        sys.exit(1 if diff(*sys.argv[1:])[0] else 0)
+        plot_patterns = options.plots.split(':') if options.plots else []
+        if options.keys:
+            sys.exit(1 if diff(*args, plot_patterns=plot_patterns)[0] else 0)
+
+        report = compare(*args, tolerance=options.tolerance,
+                         verbose=("-" != options.json),
+                         plot_patterns=plot_patterns)
+
+        if "-" == options.json:
+            json.dump(report, sys.stdout, indent=4, sort_keys=True)
+            print()
+        elif options.json:
+            with open(options.json, 'w') as output_:
+                json.dump(report, output_, indent=4, sort_keys=True)
+
+        sys.exit(1 if report["different"] else 0)
 
     except RuntimeError as error:
         print(error, file=sys.stderr)
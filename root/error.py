@@ -7,7 +7,7 @@ Copyright 2012, All right reserved
 
 from __future__ import division, print_function
 
-import math
+import root.hist
 
 def add(hist, percent):
     '''
@@ -15,8 +15,12 @@ def add(hist, percent):
     bin content.
     '''
 
-    # Add in quadrature the % * bin_content to the bin error
-    for bin_ in range(1, hist.GetNbinsX() + 1):
-        hist.SetBinError(bin_,
-                         math.sqrt(hist.GetBinError(bin_) ** 2 +
-                                   (hist.GetBinContent(bin_) * percent) ** 2))
+    # Add in quadrature the % * bin_content to the bin error; under- and
+    # overflow bins are not changed
+    hist_ = root.hist.Hist.from_th1(hist)
+
+    sumw2 = hist_.variances.copy()
+    sumw2[1:-1] += (hist_.contents[1:-1] * percent) ** 2
+    hist_.sumw2 = sumw2
+
+    hist_.update(hist)
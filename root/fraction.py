@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+'''
+Created by Samvel Khalatyan, Sep 14, 2012
+Copyright 2012, All rights reserved
+'''
+
+from __future__ import division, print_function
+
+import hashlib
+
+import numpy
+
+def key(data, templates, method):
+    '''
+    Hash of the fit inputs: data and templates are Hist objects (see
+    root.hist), method is the fitter name
+    '''
+
+    hash_ = hashlib.sha1(method.encode("utf-8"))
+    for hist in [data] + list(templates):
+        hash_.update(numpy.ascontiguousarray(hist.contents,
+                                             dtype='d').tobytes())
+        hash_.update(numpy.ascontiguousarray(hist.variances,
+                                             dtype='d').tobytes())
+
+    return hash_.hexdigest()
+
+def _nll(data, prediction):
+    '''Poisson negative log-likelihood up to a constant'''
+
+    # empty bins do not depend on log of the prediction, e.g. it may be 0
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return numpy.sum(prediction - numpy.where(data > 0,
+                                                  data * numpy.log(prediction),
+                                                  0))
+
+def _divide(numerator, denominator):
+    '''Divide arrays with 0 in bins without data or prediction'''
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return numpy.where((numerator > 0) & (denominator > 0),
+                           numerator / denominator, 0)
+
+def _beta(data, prediction, variance):
+    '''
+    Barlow-Beeston-lite: scale of the prediction in each bin that maximizes
+    the likelihood with Gaussian constraint of templates statistics
+    '''
+
+    # relative uncertainty of the prediction squared
+    sigma2 = numpy.where(prediction > 0,
+                         variance / numpy.maximum(prediction, 1e-300) ** 2, 0)
+
+    # solution of: beta^2 + (sigma2 * prediction - 1) * beta - sigma2 * data = 0
+    b = sigma2 * prediction - 1
+    return numpy.where(sigma2 > 0,
+                       (-b + numpy.sqrt(b ** 2 + 4 * sigma2 * data)) / 2,
+                       1)
+
+def fit(data, templates, barlow_beeston=False,
+        max_iterations=100, tolerance=1e-8):
+    '''
+    Binned Poisson likelihood fit of data with the sum of scaled templates.
+    The data and templates are Hist objects (see root.hist); only visible
+    bins are used in the fit (under- and overflows are skipped).
+
+    Templates statistics uncertainty is taken into account with per-bin
+    nuisance parameters (Barlow-Beeston-lite) if barlow_beeston is True.
+
+    Dictionary is returned with:
+
+        scales      NumPy array of templates scales
+        errors      scales uncertainties
+        fractions   templates fractions in data after the fit, the same as
+                    TFractionFitter results
+        iterations  number of Newton iterations
+
+    RuntimeError is raised if the fit does not converge
+    '''
+
+    d = data.contents[1:-1].ravel()
+    t = numpy.array([template.contents[1:-1].ravel()
+                     for template in templates])
+    v = numpy.array([template.variances[1:-1].ravel()
+                     for template in templates])
+
+    # bins with empty templates add a constant to the likelihood: these do
+    # not constrain scales and are skipped
+    mask = t.sum(axis=0) > 0
+    d, t, v = d[mask], t[:, mask], v[:, mask]
+
+    integrals = t.sum(axis=1)
+    if not d.sum() or not integrals.all():
+        raise RuntimeError("empty data or template")
+
+    # start with each template contributing equally
+    scales = d.sum() / (len(templates) * integrals)
+    beta = numpy.ones_like(d)
+
+    def prediction_(scales):
+        return numpy.maximum(beta * scales.dot(t), 1e-300)
+
+    nll = _nll(d, prediction_(scales))
+    for iteration in range(1, max_iterations + 1):
+        if barlow_beeston:
+            beta = _beta(d, scales.dot(t), (scales ** 2).dot(v))
+            nll = _nll(d, prediction_(scales))
+
+        prediction = prediction_(scales)
+
+        # gradient and Hessian of the NLL with respect to scales
+        bt = beta * t
+        ratio = _divide(d, prediction)
+        gradient = bt.dot(1 - ratio)
+        hessian = (bt * _divide(ratio, prediction)).dot(bt.T)
+
+        try:
+            step = numpy.linalg.solve(hessian, gradient)
+        except numpy.linalg.LinAlgError:
+            raise RuntimeError("singular Hessian in fraction fit")
+
+        # scales should stay positive: halve step if likelihood does not
+        # improve
+        factor = 1.0
+        while True:
+            scales_ = numpy.maximum(scales - factor * step, 1e-12 * scales)
+            nll_ = _nll(d, prediction_(scales_))
+            if nll_ <= nll or factor < 1e-6:
+                break
+
+            factor /= 2
+
+        converged = abs(nll - nll_) < tolerance * max(1, abs(nll))
+
+        scales, nll = scales_, nll_
+        if converged:
+            break
+    else:
+        raise RuntimeError("fraction fit did not converge in {0} "
+                           "iterations".format(max_iterations))
+
+    # templates statistics enlarges each bin uncertainty
+    prediction = prediction_(scales)
+    weight = _divide(_divide(d, prediction), prediction)
+    if barlow_beeston:
+        variance = (scales ** 2).dot(v)
+        weight = _divide(numpy.ones_like(d),
+                         _divide(prediction ** 2, d) + variance)
+        weight[0 == d] = 0
+
+    bt = beta * t
+    hessian = (bt * weight).dot(bt.T)
+    try:
+        errors = numpy.sqrt(numpy.abs(numpy.diag(numpy.linalg.inv(hessian))))
+    except numpy.linalg.LinAlgError:
+        raise RuntimeError("singular Hessian in fraction fit")
+
+    fractions = scales * integrals / d.sum()
+
+    return {"scales": scales,
+            "errors": errors,
+            "fractions": fractions,
+            "fraction_errors": errors * integrals / d.sum(),
+            "iterations": iteration}
+
+if "__main__" == __name__:
+    import unittest
+
+    class Hist(object):
+        '''Only arrays of root.hist.Hist are used in the fit'''
+
+        def __init__(self, contents):
+            self.contents = numpy.concatenate(([0], contents,
+                                               [0])).astype('d')
+            self.variances = self.contents.copy()
+
+    hist_ = Hist
+
+    class TestFit(unittest.TestCase):
+        def setUp(self):
+            random = numpy.random.RandomState(1)
+            x = numpy.linspace(0, 1, 40)
+
+            self.signal = hist_(1000 * numpy.exp(-((x - 0.3) / 0.1) ** 2))
+            self.background = hist_(200 * numpy.exp(-x))
+            self.data = hist_(random.poisson(0.5 * self.signal.contents[1:-1] +
+                                             2.0 *
+                                             self.background.contents[1:-1]))
+
+        def test_scales(self):
+            result = fit(self.data, [self.signal, self.background])
+
+            self.assertAlmostEqual(result["scales"][0], 0.5, delta=0.05)
+            self.assertAlmostEqual(result["scales"][1], 2.0, delta=0.2)
+            self.assertAlmostEqual(result["fractions"].sum(), 1, delta=1e-3)
+
+        def test_barlow_beeston(self):
+            result = fit(self.data, [self.signal, self.background],
+                         barlow_beeston=True)
+            plain = fit(self.data, [self.signal, self.background])
+
+            self.assertAlmostEqual(result["scales"][0], 0.5, delta=0.05)
+            self.assertTrue((result["errors"] >= plain["errors"] * 0.9).all())
+
+        def test_empty_templates_bin(self):
+            # data in the bin where all templates are empty
+            self.data.contents[5] += 10
+            self.signal.contents[5] = self.signal.variances[5] = 0
+            self.background.contents[5] = self.background.variances[5] = 0
+
+            for barlow_beeston in False, True:
+                result = fit(self.data, [self.signal, self.background],
+                             barlow_beeston=barlow_beeston)
+
+                self.assertTrue(numpy.isfinite(result["errors"]).all())
+                self.assertAlmostEqual(result["scales"][0], 0.5, delta=0.05)
+
+        def test_empty_data_bins(self):
+            self.data.contents[1:10] = 0
+
+            result = fit(self.data, [self.signal, self.background],
+                         barlow_beeston=True)
+
+            self.assertTrue(numpy.isfinite(result["scales"]).all())
+            self.assertTrue(numpy.isfinite(result["errors"]).all())
+
+        def test_key(self):
+            self.assertEqual(key(self.data, [self.signal], "poisson"),
+                             key(self.data, [self.signal], "poisson"))
+            self.assertNotEqual(key(self.data, [self.signal], "poisson"),
+                                key(self.data, [self.signal], "poisson-bb"))
+
+    unittest.main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+
+'''
+Created by Samvel Khalatyan, Sep 14, 2012
+Copyright 2012, All rights reserved
+'''
+
+from __future__ import division, print_function
+
+import numpy
+import ROOT
+
+def _array(tarray, dtype, size):
+    '''
+    Copy ROOT TArray storage into NumPy array with a single call instead of
+    reading values one by one
+    '''
+
+    if not size:
+        return numpy.zeros(0)
+
+    buffer_ = tarray.GetArray()
+    if hasattr(buffer_, "SetSize"):
+        # PyROOT buffers have no size by default
+        buffer_.SetSize(size)
+    elif hasattr(buffer_, "reshape"):
+        buffer_ = buffer_.reshape((size, ))
+
+    return numpy.frombuffer(buffer_, dtype=dtype, count=size).astype('d')
+
+def _contents(hist):
+    '''Extract all cells contents including under- and overflows'''
+
+    size = hist.GetSize()
+    for type_, dtype in (("TArrayD", "f8"),
+                         ("TArrayF", "f4"),
+                         ("TArrayI", "i4"),
+                         ("TArrayS", "i2"),
+                         ("TArrayC", "i1")):
+        if hist.InheritsFrom(type_):
+            return _array(hist, dtype, size)
+
+    return numpy.array([hist.GetBinContent(cell) for cell in range(size)],
+                       dtype='d')
+
+# classes that are copied into Hist and back without loss
+_LOSSLESS = ("TH1F", "TH1D", "TH2F", "TH2D")
+
+# size of TH1 statistics buffer, see TH1::GetStats
+_NSTAT = 13
+
+def lossless(hist):
+    '''
+    Check if ROOT histogram survives conversion into Hist and back: only
+    plain TH1F/TH1D/TH2F/TH2D without bin labels do. Integer histograms
+    would be truncated, profiles store sums instead of means, etc. Use ROOT
+    histogram directly otherwise
+    '''
+
+    if hist.ClassName() not in _LOSSLESS:
+        return False
+
+    axes = ((hist.GetXaxis(), ) if 1 == hist.GetDimension()
+            else (hist.GetXaxis(), hist.GetYaxis()))
+
+    return not any(axis.GetLabels() for axis in axes)
+
+class Hist(object):
+    '''
+    Array backed histogram
+
+    The bins contents and sum of weights squared (sumw2) are kept in NumPy
+    arrays that include under- and overflow cells in the same order as
+    TH1 does, e.g. for 1D histogram with N bins:
+
+        contents[0]         underflow
+        contents[1:N + 1]   bins
+        contents[N + 1]     overflow
+
+    Axes are described with dictionaries:
+
+        bins    number of bins
+        min     axis low edge
+        max     axis high edge
+        edges   NumPy array of bins edges for variable binning or None
+        title   axis title
+
+    The sumw2 is None if histogram does not store errors: the bin error is
+    sqrt(content) in this case. Statistics (sum of weights, moments, etc.
+    see TH1::GetStats) are kept in stats array or None if these should be
+    recalculated from bins. Use from_th1 and to_th1 to convert histograms
+    to and from ROOT (see lossless). Hist objects can be pickled and sent
+    between processes
+    '''
+
+    def __init__(self, axes, contents, sumw2=None,
+                 class_name="TH1D", name="", title="", entries=0,
+                 stats=None):
+
+        self.axes = axes
+        self.contents = contents
+        self.sumw2 = sumw2
+        self.class_name = class_name
+        self.name = name
+        self.title = title
+        self.entries = entries
+        self.stats = stats
+
+    @classmethod
+    def from_th1(cls, hist):
+        '''Copy ROOT histogram into Hist'''
+
+        if 2 < hist.GetDimension():
+            raise RuntimeError("only 1D and 2D plots are supported: " +
+                               hist.GetName())
+
+        if hist.InheritsFrom("TProfile") or hist.InheritsFrom("TProfile2D"):
+            raise RuntimeError("profiles are not supported: " +
+                               hist.GetName())
+
+        axes = []
+        for axis in ((hist.GetXaxis(), ) if 1 == hist.GetDimension()
+                     else (hist.GetXaxis(), hist.GetYaxis())):
+            bins = axis.GetXbins()
+            axes.append({"bins": axis.GetNbins(),
+                         "min": axis.GetXmin(),
+                         "max": axis.GetXmax(),
+                         "edges": (_array(bins, "f8", bins.GetSize())
+                                   if bins.GetSize() else None),
+                         "title": axis.GetTitle()})
+
+        sumw2 = hist.GetSumw2()
+
+        stats = numpy.zeros(_NSTAT)
+        hist.GetStats(stats)
+
+        return cls(axes=axes,
+                   contents=_contents(hist),
+                   sumw2=(_array(sumw2, "f8", sumw2.GetSize())
+                          if sumw2.GetSize() else None),
+                   class_name=hist.ClassName(),
+                   name=hist.GetName(),
+                   title=hist.GetTitle(),
+                   entries=hist.GetEntries(),
+                   stats=stats)
+
+    def to_th1(self):
+        '''Create new ROOT histogram, the histogram is not attached to file'''
+
+        binning = []
+        for axis in self.axes:
+            if axis["edges"] is not None:
+                binning.extend((axis["bins"],
+                                numpy.ascontiguousarray(axis["edges"],
+                                                        dtype='d')))
+            else:
+                binning.extend((axis["bins"], axis["min"], axis["max"]))
+
+        status = ROOT.TH1.AddDirectoryStatus()
+        ROOT.TH1.AddDirectory(False)
+        try:
+            hist = getattr(ROOT, self.class_name)(self.name, self.title,
+                                                  *binning)
+        finally:
+            ROOT.TH1.AddDirectory(status)
+
+        for axis, info in zip((hist.GetXaxis(), hist.GetYaxis()), self.axes):
+            axis.SetTitle(info["title"])
+
+        self.update(hist)
+
+        # statistics are set last: bins update resets these
+        if self.stats is not None:
+            hist.PutStats(numpy.ascontiguousarray(self.stats, dtype='d'))
+
+        return hist
+
+    def update(self, hist):
+        '''
+        Write contents and sumw2 into ROOT histogram with the same binning.
+        Histogram styles, titles, etc. are not changed
+        '''
+
+        hist.SetContent(numpy.ascontiguousarray(self.contents, dtype='d'))
+        if self.sumw2 is not None:
+            if not hist.GetSumw2N():
+                hist.Sumw2()
+
+            hist.GetSumw2().Set(self.sumw2.size,
+                                numpy.ascontiguousarray(self.sumw2,
+                                                        dtype='d'))
+
+        hist.SetEntries(self.entries)
+
+    @property
+    def dimension(self):
+        '''Number of axes'''
+
+        return len(self.axes)
+
+    @property
+    def variances(self):
+        '''Bin errors squared'''
+
+        return (self.sumw2 if self.sumw2 is not None
+                else numpy.abs(self.contents))
+
+    @property
+    def errors(self):
+        '''Bin errors'''
+
+        return numpy.sqrt(self.variances)
+
+    def edges(self, axis=0):
+        '''Bins edges of the axis'''
+
+        info = self.axes[axis]
+
+        return (info["edges"] if info["edges"] is not None
+                else numpy.linspace(info["min"], info["max"],
+                                    info["bins"] + 1))
+
+    def copy(self):
+        '''Deep copy of the histogram'''
+
+        return Hist(axes=[dict(axis) for axis in self.axes],
+                    contents=self.contents.copy(),
+                    sumw2=None if self.sumw2 is None else self.sumw2.copy(),
+                    class_name=self.class_name,
+                    name=self.name,
+                    title=self.title,
+                    entries=self.entries,
+                    stats=None if self.stats is None else self.stats.copy())
+
+    def scale(self, factor):
+        '''Scale contents and errors the same way TH1::Scale does'''
+
+        self.sumw2 = self.variances * factor ** 2
+        self.contents = self.contents * factor
+        if self.stats is not None:
+            self.stats = self.stats * factor
+            self.stats[1] *= factor
+
+        return self
+
+    def add(self, other, factor=1):
+        '''Add other histogram the same way TH1::Add does'''
+
+        if self.contents.shape != other.contents.shape:
+            raise RuntimeError("can not add histograms with different "
+                               "binning: {0} {1}".format(self.name,
+                                                         other.name))
+
+        self.sumw2 = self.variances + other.variances * factor ** 2
+        self.contents = self.contents + other.contents * factor
+        self.entries += other.entries
+        if self.stats is None or other.stats is None:
+            self.stats = None
+        else:
+            stats = other.stats * factor
+            stats[1] *= factor
+            self.stats = self.stats + stats
+
+        return self
+
+    def nbytes(self):
+        '''Memory used by arrays'''
+
+        return (self.contents.nbytes +
+                (self.sumw2.nbytes if self.sumw2 is not None else 0))
+
+def total(hists):
+    '''
+    Sum all ROOT histograms into one Hist; None is returned if there are no
+    histograms
+    '''
+
+    result = None
+    for hist in hists:
+        if not hist:
+            continue
+
+        if result:
+            result.add(Hist.from_th1(hist))
+        else:
+            result = Hist.from_th1(hist)
+
+    return result
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+
+'''
+Created by Samvel Khalatyan, Sep 14, 2012
+Copyright 2012, All rights reserved
+'''
+
+from __future__ import division, print_function
+
+import json
+import os
+import sys
+import tempfile
+
+from root import template
+
+class _IndexLoader(template.Loader):
+    '''Scan the whole file and record every histogram'''
+
+    def __init__(self):
+        template.Loader.__init__(self)
+
+        self.entries = []
+
+        self._path = None
+
+    def process_key(self, path, class_name):
+        '''Remember path of the histogram to be read next'''
+
+        self._path = path
+
+        return True
+
+    def process_plot(self, hist):
+        '''Record histogram class, dimension and binning'''
+
+        axes = []
+        for axis in (hist.GetXaxis(), hist.GetYaxis(),
+                     hist.GetZaxis())[:hist.GetDimension()]:
+            bins = axis.GetXbins()
+            axes.append({"bins": axis.GetNbins(),
+                         "min": axis.GetXmin(),
+                         "max": axis.GetXmax(),
+                         "edges": ([bins.At(i) for i in range(bins.GetSize())]
+                                   if bins.GetSize() else None)})
+
+        self.entries.append({"path": self._path,
+                             "class": hist.ClassName(),
+                             "dimension": hist.GetDimension(),
+                             "axes": axes})
+
+def _stat(filename):
+    '''File size and modification time the index validity is checked with'''
+
+    stat = os.stat(filename)
+
+    return [stat.st_size, stat.st_mtime]
+
+class Index(object):
+    '''
+    Index of the histograms in ROOT files
+
+    The index is a union of histograms found in all indexed inputs and is
+    used to read histograms with direct Get(path) calls instead of scanning
+    every file: histograms absent in some input are skipped for that input.
+    Each indexed input is kept with its size, modification time and paths:
+    only new or changed inputs are scanned when the index is updated.
+
+    Each entry is a dictionary with:
+
+        path        folders with histogram name, e.g.: /jet1/pt
+        class       histogram class name, e.g.: TH1D
+        dimension   number of axes
+        axes        list of dictionaries with bins, min, max and edges (list
+                    of variable bins edges or None)
+    '''
+
+    def __init__(self, entries=[], inputs={}):
+        '''
+        Entries are the union of histograms and inputs is a dictionary with
+        input absolute filename keys and {"stat": [size, mtime], "paths":
+        [...]} values
+        '''
+
+        self.entries = list(entries)
+        self.inputs = dict(inputs)
+
+    @classmethod
+    def build(cls, *filenames):
+        '''Scan ROOT files and index all histograms'''
+
+        index = cls()
+        index.update(filenames)
+
+        return index
+
+    def update(self, filenames):
+        '''
+        Scan files that are not indexed or have changed since these were
+        indexed and merge their histograms into the index: entries of the
+        scanned files replace existing ones with the same path. Entries that
+        are not found in any input any more are removed.
+
+        True is returned if the index has changed
+        '''
+
+        changed = False
+        entries = dict((entry["path"], entry) for entry in self.entries)
+        for filename in filenames:
+            filename = os.path.abspath(filename)
+            stat = _stat(filename)
+            info = self.inputs.get(filename)
+            if info and stat == info["stat"]:
+                continue
+
+            loader = _IndexLoader()
+            loader.load(filename)
+
+            for entry in loader.entries:
+                entries[entry["path"]] = entry
+
+            self.inputs[filename] = {"stat": stat,
+                                     "paths": [entry["path"]
+                                               for entry in loader.entries]}
+            changed = True
+
+        if changed:
+            paths = set()
+            for info in self.inputs.values():
+                paths.update(info["paths"])
+
+            self.entries = [entry for path, entry in sorted(entries.items())
+                            if path in paths]
+
+        return changed
+
+    @classmethod
+    def load(cls, filename):
+        '''Load index from JSON file'''
+
+        if not os.path.exists(filename):
+            raise RuntimeError("index file does not exist: " + filename)
+
+        with open(filename) as input_:
+            data = json.load(input_)
+
+        # inputs of older index format are scanned again
+        return cls(data["entries"],
+                   dict((filename, info)
+                        for filename, info in data.get("inputs", {}).items()
+                        if isinstance(info, dict)))
+
+    def save(self, filename):
+        '''Save index into JSON file'''
+
+        # write into temporary file first so that other processes never see
+        # incomplete index
+        folder = os.path.dirname(os.path.abspath(filename))
+        handle, tmp_filename = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "w") as output_:
+                json.dump({"inputs": self.inputs, "entries": self.entries},
+                          output_, indent=1, sort_keys=True)
+
+            # temporary files are private: use permissions of a plain open
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_filename, 0o666 & ~umask)
+
+            os.rename(tmp_filename, filename)
+        except:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+
+            raise
+
+    @property
+    def paths(self):
+        '''List of all indexed histograms paths'''
+
+        return [entry["path"] for entry in self.entries]
+
+    @property
+    def folders(self):
+        '''Sorted list of all folders that host histograms'''
+
+        folders = set()
+        for path in self.paths:
+            folders.update('/'.join(path.split('/')[:level])
+                           for level in range(2, path.count('/') + 1))
+
+        return sorted(folders)
+
+def load(filename, inputs=[]):
+    '''
+    Load index from file and update it with existing inputs that are new or
+    have changed (see Index.update); the index is saved if updated. Inputs
+    indexed before are kept, e.g. runs with different channels share the
+    index. The index is used in memory only if it can not be saved, e.g.
+    folder is read-only
+    '''
+
+    inputs = [input_ for input_ in inputs if os.path.exists(input_)]
+    if not inputs:
+        raise RuntimeError("can not create index: no input exists")
+
+    index = None
+    if os.path.exists(filename):
+        try:
+            index = Index.load(filename)
+        except (KeyError, ValueError):
+            # corrupted index: it will be re-created
+            pass
+
+    if not index:
+        index = Index()
+
+    if not index.update(inputs):
+        return index
+
+    try:
+        index.save(filename)
+    except (IOError, OSError) as error:
+        print("warning: index is not saved in", filename, "-", error,
+              file=sys.stderr)
+
+    return index
+
+if "__main__" == __name__:
+    if 3 > len(sys.argv):
+        print("usage: {0} input.root [input.root ...] index.json".format(
+              sys.argv[0]), file=sys.stderr)
+
+        sys.exit(1)
+
+    index = Index.build(*sys.argv[1:-1])
+    index.save(sys.argv[-1])
+
+    print("indexed", len(index.entries), "histograms in",
+          len(index.folders), "folders")
@@ -7,8 +7,11 @@ Copyright 2012, All right reserved
 
 from __future__ import division
 
+import numpy
 import ROOT
 
+from root.hist import Hist
+
 def efficiency(hist, invert=False, normalize=True):
     '''
     Calculate histogram efficiency
@@ -25,46 +28,195 @@ def efficiency(hist, invert=False, normalize=True):
     clone_ = hist.Clone()
     clone_.Reset()
 
-    error_ = ROOT.Double()
-    bins_ = hist.GetNbinsX()
-    for bin_ in range(1, bins_ + 1):
-        if invert:
-            clone_.SetBinContent(bin_, hist.IntegralAndError(bin_,
-                                                             bins_ + 1, error_))
-        else:
-            clone_.SetBinContent(bin_, hist.IntegralAndError(0, bin_, error_))
-
-        clone_.SetBinError(bin_, error_)
+    # cumulative sums of contents and errors squared including under- and
+    # overflow bins are calculated in one pass
+    hist_ = Hist.from_th1(hist)
+    contents = hist_.contents
+    variances = hist_.variances
+    if invert:
+        contents = numpy.cumsum(contents[::-1])[::-1]
+        variances = numpy.cumsum(variances[::-1])[::-1]
+    else:
+        contents = numpy.cumsum(contents)
+        variances = numpy.cumsum(variances)
+
+    # under- and overflow bins are empty
+    efficiency_ = hist_.copy()
+    efficiency_.contents = numpy.zeros(contents.size)
+    efficiency_.contents[1:-1] = contents[1:-1]
+    efficiency_.sumw2 = numpy.zeros(variances.size)
+    efficiency_.sumw2[1:-1] = variances[1:-1]
 
     if normalize:
-        clone_.Scale(1 / hist.Integral())
+        efficiency_.scale(1 / hist.Integral())
+
+    efficiency_.update(clone_)
 
     return clone_
 
-def find_maximum(hist):
+def _visible(hist, first=None, last=None):
     '''
-    Return the "Y + error" for the bin with maximum
-    
-    WARNING: the true maximum value might be incorrect especially in the case
-             of bins with low stats and large errors; scan manually bin by bin
-             in these cases
+    Array of "Y + error" in visible bins: first and last are x-axis bins
+    (both included). All bins are visible by default. The histogram is ROOT
+    one or Hist
     '''
 
-    bin_ = hist.GetMaximumBin()
-    return hist.GetBinContent(bin_) + hist.GetBinError(bin_)
+    if not isinstance(hist, Hist):
+        hist = Hist.from_th1(hist)
 
-def maximum(hists=[], stacks=[]):
+    values = hist.contents + hist.errors
+    if 1 < hist.dimension:
+        # cells are ordered the same way as TH2 global bins: x changes first
+        values = values.reshape(hist.axes[1]["bins"] + 2,
+                                hist.axes[0]["bins"] + 2)[1:-1]
+
+    return values[..., first or 1:(last or hist.axes[0]["bins"]) + 1].ravel()
+
+def find_maximum(hist):
     '''
-    Search for maximum "Y + error" amonh histograms and stacks
+    Return the maximum "Y + error" among visible bins (see maximum); the
+    histogram is ROOT one or Hist
+    '''
+
+    return maximum(hists=[hist])
 
-    empty stacks are accepted. The function has the same limitations as the
-    find_maximum function (read WARNINGs)
+def maximum(hists=[], stacks=[], bins=None):
     '''
+    Search for maximum "Y + error" among histograms and stacks. Histograms
+    are ROOT ones or Hist, e.g. total of the stacked histograms. Each
+    histogram in the stack is used separately.
 
-    maximums = [find_maximum(hist) for hist in hists if hist]
+    Only visible bins are searched: bins is a (first, last) tuple of x-axis
+    bins. The range of the first ROOT histogram is used by default, e.g. the
+    one set with TAxis::SetRangeUser.
+
+    Empty stacks are accepted. 0 is returned if there are no histograms
+    '''
 
+    hists = [hist for hist in hists if hist]
     for stack in stacks:
         if stack and stack.GetHists():
-            maximums.extend([find_maximum(hist) for hist in stack.GetHists() if hist])
+            hists.extend(hist for hist in stack.GetHists() if hist)
+
+    if not hists:
+        return 0
+
+    if not bins:
+        axis = next((hist.GetXaxis() for hist in hists
+                     if not isinstance(hist, Hist)), None)
+        bins = (axis.GetFirst(), axis.GetLast()) if axis else (None, None)
+
+    # all visible bins are searched in one pass
+    values = numpy.concatenate([_visible(hist, *bins) for hist in hists])
+
+    return float(values.max()) if values.size else 0
 
-    return max(maximums)
+if "__main__" == __name__:
+    import unittest
+
+    def efficiency_by_bin(hist, invert=False, normalize=True):
+        '''Reference bin-by-bin implementation of the efficiency'''
+
+        clone_ = hist.Clone()
+        clone_.Reset()
+
+        error_ = ROOT.Double()
+        bins_ = hist.GetNbinsX()
+        for bin_ in range(1, bins_ + 1):
+            if invert:
+                clone_.SetBinContent(bin_, hist.IntegralAndError(bin_,
+                                                                 bins_ + 1,
+                                                                 error_))
+            else:
+                clone_.SetBinContent(bin_, hist.IntegralAndError(0, bin_,
+                                                                 error_))
+
+            clone_.SetBinError(bin_, error_)
+
+        if normalize:
+            clone_.Scale(1 / hist.Integral())
+
+        return clone_
+
+    class TestEfficiency(unittest.TestCase):
+        '''Compare cumulative efficiency with bin-by-bin integrals'''
+
+        def setUp(self):
+            function = ROOT.TF1("efficiency_gaus", "gaus(0)", -10, 110)
+            function.SetParameters(1, 50, 20)
+
+            self.hist = ROOT.TH1D("efficiency_hist", "", 100, 0, 100)
+            self.hist.SetDirectory(0)
+            self.hist.Sumw2()
+            self.hist.FillRandom("efficiency_gaus", 10000)
+            self.hist.Scale(0.3)
+
+        def assertSameHist(self, hist, reference):
+            for bin_ in range(0, reference.GetNbinsX() + 2):
+                self.assertAlmostEqual(hist.GetBinContent(bin_),
+                                       reference.GetBinContent(bin_))
+                self.assertAlmostEqual(hist.GetBinError(bin_),
+                                       reference.GetBinError(bin_))
+
+        def test_forward(self):
+            self.assertSameHist(efficiency(self.hist),
+                                efficiency_by_bin(self.hist))
+
+        def test_inverted(self):
+            self.assertSameHist(efficiency(self.hist, invert=True),
+                                efficiency_by_bin(self.hist, invert=True))
+
+        def test_not_normalized(self):
+            for invert in False, True:
+                self.assertSameHist(
+                        efficiency(self.hist, invert, normalize=False),
+                        efficiency_by_bin(self.hist, invert, normalize=False))
+
+        def test_no_sumw2(self):
+            hist = ROOT.TH1F("efficiency_no_sumw2", "", 50, 0, 100)
+            hist.SetDirectory(0)
+            hist.FillRandom("efficiency_gaus", 1000)
+
+            for invert in False, True:
+                self.assertSameHist(efficiency(hist, invert),
+                                    efficiency_by_bin(hist, invert))
+
+    class TestMaximum(unittest.TestCase):
+        '''Compare maximum with bin-by-bin search'''
+
+        def setUp(self):
+            function = ROOT.TF1("maximum_gaus", "gaus(0)", -10, 110)
+            function.SetParameters(1, 50, 20)
+
+            self.hist = ROOT.TH1D("maximum_hist", "", 100, 0, 100)
+            self.hist.SetDirectory(0)
+            self.hist.Sumw2()
+            self.hist.FillRandom("maximum_gaus", 1000)
+
+        def maximum_by_bin(self, hist):
+            axis = hist.GetXaxis()
+
+            return max(hist.GetBinContent(bin_) + hist.GetBinError(bin_)
+                       for bin_ in range(axis.GetFirst(), axis.GetLast() + 1))
+
+        def test_maximum(self):
+            self.assertAlmostEqual(find_maximum(self.hist),
+                                   self.maximum_by_bin(self.hist))
+
+        def test_range(self):
+            self.hist.GetXaxis().SetRangeUser(0, 20)
+            self.assertAlmostEqual(find_maximum(self.hist),
+                                   self.maximum_by_bin(self.hist))
+            self.assertAlmostEqual(maximum(hists=[Hist.from_th1(self.hist)],
+                                           bins=(1, 20)),
+                                   self.maximum_by_bin(self.hist))
+
+        def test_stack(self):
+            stack = ROOT.THStack()
+            stack.Add(self.hist)
+
+            total = Hist.from_th1(self.hist).scale(2)
+            self.assertAlmostEqual(maximum(hists=[total], stacks=[stack]),
+                                   self.maximum_by_bin(self.hist) * 2)
+
+    unittest.main()
@@ -15,7 +15,8 @@ class Loader(object):
     Load histograms from ROOT file.
 
     The processing of each plot and found directory should be defined by child
-    classes by overriding process_plot and process_dir methods
+    classes by overriding process_plot and process_dir methods. Keys may be
+    rejected before the object is read from file with process_key
     '''
 
     def __init__(self):
@@ -27,7 +28,7 @@ class Loader(object):
         if not os.path.exists(filename):
             raise RuntimeError("input file does not exit: " + filename)
 
-        with tfile.topen(filename) as input_:
+        with tfile.borrow(filename) as input_:
             self._load(input_)
 
     def process_plot(self, hist):
@@ -35,16 +36,65 @@ class Loader(object):
 
         pass
 
-    def _load(self, dir_):
+    def process_dir(self, path):
+        '''
+        Called for every sub-directory before it is scanned: return False to
+        skip the directory with all its content
+        '''
+
+        return True
+
+    def process_key(self, path, class_name):
+        '''
+        Called for every histogram key before the object is read from file:
+        return False to skip the histogram. The path includes histogram name,
+        e.g.: /jet1/pt
+        '''
+
+        return True
+
+    def _load(self, dir_, path=''):
         '''The loader back-end'''
 
+        # keys are sorted by cycle: only the highest cycle is read, the same
+        # way TDirectory::Get does
+        names = set()
         for key in dir_.GetListOfKeys():
-            obj = dir_.Get(key.GetName())
+            name = key.GetName()
+            if name in names:
+                continue
+
+            names.add(name)
+
+            # use TKey meta-data to decide if object should be read at all
+            class_ = ROOT.TClass.GetClass(key.GetClassName())
+            if not class_:
+                continue
+
+            path_ = path + '/' + name
+            if class_.InheritsFrom("TDirectory"):
+                if not self.process_dir(path_):
+                    continue
+
+            elif class_.InheritsFrom("TH1"):
+                if not self.process_key(path_, key.GetClassName()):
+                    continue
+
+            else:
+                continue
+
+            obj = dir_.Get(name)
             if not obj:
                 continue
 
             if isinstance(obj, ROOT.TH1):
                 self.process_plot(obj)
 
+                # file may stay open in the pool: release the plot memory
+                # and make sure it is read again next time
+                if obj.GetDirectory():
+                    obj.SetDirectory(0)
+                    ROOT.SetOwnership(obj, True)
+
             elif isinstance(obj, ROOT.TDirectory):
-                self._load(obj)
+                self._load(obj, path_)
@@ -7,6 +7,9 @@ Copyright 2011, All rights reserved
 
 from __future__ import print_function
 
+import collections
+import os
+
 import ROOT
 
 class topen(object):
@@ -56,6 +59,143 @@ class topen(object):
             self._file.Close()
             self._file = None
 
+class Pool(object):
+    '''
+    LRU pool of files open for reading
+
+    Files are borrowed from the pool and released when not needed. Released
+    files are kept open and the next borrow of the same file does not reopen
+    it, e.g. file header and streamer info are not read again. The number of
+    open files is limited: the least recently used files that are not
+    borrowed are closed once the limit is reached.
+
+    A file is reopened if it is modified on disk. Files open by parent
+    process are not reused after fork: these share file offsets with the
+    parent
+    '''
+
+    def __init__(self, size=64):
+        '''Initialize pool with the maximum number of open files'''
+
+        self.size = size
+
+        self._pid = os.getpid()
+
+        # (filename, signature) -> [TFile, number of borrows]
+        self._files = collections.OrderedDict()
+
+    def borrow(self, filename):
+        '''Get open file: it should be released when not needed'''
+
+        if self._pid != os.getpid():
+            # files belong to parent process: forget these without closing
+            self._pid = os.getpid()
+            self._files = collections.OrderedDict()
+
+        key = self._key(filename)
+
+        entry = self._files.pop(key, None)
+        if not entry:
+            # close old versions of the file
+            for key_, (file_, borrows) in list(self._files.items()):
+                if key_[0] == key[0] and not borrows:
+                    file_.Close()
+                    del self._files[key_]
+
+            # opened file becomes current directory: restore it so that new
+            # objects are not attached to the pooled file
+            directory = ROOT.gDirectory.GetPath()
+            try:
+                file_ = ROOT.TFile.Open(filename, "readonly")
+            finally:
+                ROOT.gDirectory.cd(directory)
+
+            if not file_ or file_.IsZombie():
+                raise RuntimeError("failed to open file "
+                                   "{0!r}".format(filename))
+
+            entry = [file_, 0]
+
+        entry[1] += 1
+
+        # the most recently used file is kept at the end
+        self._files[key] = entry
+
+        self.evict()
+
+        return entry[0]
+
+    def release(self, file_):
+        '''Return borrowed file into the pool'''
+
+        for entry in self._files.values():
+            if entry[0] is file_:
+                entry[1] = max(entry[1] - 1, 0)
+
+                break
+
+        self.evict()
+
+    def evict(self):
+        '''Close least recently used files that are not borrowed'''
+
+        for key, (file_, borrows) in list(self._files.items()):
+            if len(self._files) <= self.size:
+                break
+
+            if not borrows:
+                file_.Close()
+                del self._files[key]
+
+    def clear(self):
+        '''Close all files that are not borrowed'''
+
+        size, self.size = self.size, 0
+        try:
+            self.evict()
+        finally:
+            self.size = size
+
+    def _key(self, filename):
+        '''Pool key: file path and its signature on disk'''
+
+        filename = os.path.abspath(filename)
+        try:
+            stat = os.stat(filename)
+            signature = (stat.st_ino, stat.st_size, stat.st_mtime)
+        except OSError:
+            # e.g. remote file
+            signature = None
+
+        return filename, signature
+
+# files borrowed by all loaders are kept here
+pool = Pool()
+
+class borrow(object):
+    '''
+    Context manager to borrow file from the pool, e.g.:
+
+        with borrow("input.root") as input_:
+            plot = input_.Get("hello")
+
+    The file is returned into the pool but is not closed at exit
+    '''
+
+    def __init__(self, filename, pool_=None):
+        self._filename = filename
+        self._pool = pool_ or pool
+        self._file = None
+
+    def __enter__(self):
+        self._file = self._pool.borrow(self._filename)
+
+        return self._file
+
+    def __exit__(self, error_type, error_value, error_traceback):
+        self._pool.release(self._file)
+        self._file = None
+
 if "__main__" == __name__:
     import sys
 
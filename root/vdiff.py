@@ -5,8 +5,10 @@ Created by Samvel Khalatyan, May 16, 2012
 Copyright 2012, All rights reserved
 '''
 
-from __future__ import print_function
+from __future__ import division, print_function
 
+import json
+import multiprocessing
 import os
 import sys
 
@@ -15,110 +17,330 @@ import root.tfile
 import root.comparison
 import root.diff
 
-def vdiff(lfile, rfile, verbose=True):
+try:
+    from html import escape
+except ImportError:
+    from cgi import escape
+
+def _stats(lhist, rhist, same_binning=True):
+    '''
+    Statistical tests of two histograms shapes: chi2/ndf and Kolmogorov
+    probability. Tests that can not be run, e.g. empty histograms or
+    histograms with different binning, are None
     '''
-    Compare two files and plot diffed histograms 
 
-    Given two ROOT files and set of common top-level keys, plot only these
-    histograms that are NOT equal. Integral of the histograms are used for
-    the latter check.
+    stats = {"chi2": None, "ks": None}
+    if same_binning and lhist.Integral() and rhist.Integral():
+        stats["chi2"] = lhist.Chi2Test(rhist, "WW CHI2/NDF")
+        stats["ks"] = lhist.KolmogorovTest(rhist)
 
-    Usage:
+    return stats
 
-        vdiff("file1.root", "file2.root")
+def _draw(key, lhist, rhist, lfile, rfile, same_binning=True):
+    '''
+    Draw two histograms overlayed with their ratio. Histograms with different
+    binning are overlayed without ratio. The comparison canvas is returned
+    with all drawn objects attached to it
+    '''
+
+    # Adjust plots style
+    lhist.SetLineColor(ROOT.kGreen + 1)
+    rhist.SetLineColor(ROOT.kRed + 1)
+
+    for hist in lhist, rhist:
+        hist.SetFillStyle(0)
+        hist.SetLineStyle(1)
+
+    # Draw two histograms overlayed
+    cmp_ = root.comparison.Canvas()
+    cmp_.canvas.cd(1)
+
+    if same_binning:
+        stack = ROOT.THStack()
+        stack.Add(lhist)
+        stack.Add(rhist)
+        stack.Draw("9 hist nostack")
+    else:
+        # histograms are drawn in axis coordinates: bins need not match
+        stack = None
+        lhist.SetMaximum(1.1 * max(lhist.GetMaximum(), rhist.GetMaximum()))
+        lhist.Draw("9 hist")
+        rhist.Draw("9 hist same")
+
+    # Add legend for offline review
+    legend = ROOT.TLegend(0.4, 0.7, 0.88, 0.8)
+    legend.SetTextSizePixels(18)
+    legend.SetHeader(key)
+    legend.AddEntry(lhist, lfile, "l")
+    legend.AddEntry(rhist, rfile, "l")
+    legend.Draw("9")
+
+    # Draw comparison
+    cmp_.canvas.cd(2)
+    if same_binning:
+        ratio = root.comparison.ratio(lhist, rhist)
+        ratio.GetYaxis().SetTitle("#frac{GREEN}{RED}")
+        ratio.GetYaxis().SetRangeUser(0, 5)
+    else:
+        ratio = ROOT.TPaveText(0.1, 0.3, 0.9, 0.7, "NDC")
+        ratio.AddText("different binning: no ratio")
+    ratio.Draw("9")
+
+    cmp_.canvas.Update()
+
+    # objects should live as long as the canvas
+    cmp_.objects = [lhist, rhist, stack, legend, ratio]
+
+    return cmp_
+
+def _read(lfile_, rfile_, key):
+    '''Read histogram from both files or None if it is not a histogram'''
+
+    lhist = lfile_.Get(key)
+    rhist = rfile_.Get(key)
+    if (not lhist or not rhist or
+        not isinstance(lhist, ROOT.TH1) or
+        not isinstance(rhist, ROOT.TH1)):
+
+        return None
+
+    for hist in lhist, rhist:
+        hist.SetDirectory(0)
+        ROOT.SetOwnership(hist, True)
+
+    return lhist, rhist
+
+def _filename(key, extension):
+    '''Plot filename: folders are flattened'''
+
+    return key.strip('/').replace('/', '_') + '.' + extension
+
+def _render(task):
+    '''
+    Draw and save comparison of one histogram as image. The task is a tuple
+    of left and right filenames, histogram path, output folder and flag if
+    histograms have the same binning. The function is run in worker process:
+    files are open in each worker.
+
+    Dictionary with path, saved filename and statistical tests is returned
     '''
 
-    result, common_keys = root.diff.diff(lfile, rfile, verbose=False)[1:3:2]
+    lfile, rfile, key, folder, same_binning = task
+
+    ROOT.gROOT.SetBatch(True)
+    ROOT.gErrorIgnoreLevel = ROOT.kWarning
+
+    with root.tfile.borrow(lfile) as lfile_:
+        with root.tfile.borrow(rfile) as rfile_:
+            hists = _read(lfile_, rfile_, key)
+
+    if not hists:
+        return None
 
-    if result and verbose:
+    result = {"path": key, "filename": _filename(key, "png")}
+    result.update(_stats(hists[0], hists[1], same_binning))
+
+    cmp_ = _draw(key, hists[0], hists[1], lfile, rfile, same_binning)
+    cmp_.canvas.SaveAs(os.path.join(folder, result["filename"]))
+    cmp_.canvas.Close()
+
+    return result
+
+def _write_index(folder, lfile, rfile, results):
+    '''Write HTML page with all images and statistical tests'''
+
+    def format_(value):
+        return "-" if value is None else "{0:.3g}".format(value)
+
+    with open(os.path.join(folder, "index.html"), 'w') as output_:
+        print("<html><head><title>vdiff</title></head><body>", file=output_)
+        print("<h1><span style='color:green'>{0}</span> vs "
+              "<span style='color:red'>{1}</span></h1>".format(
+                  escape(lfile, quote=True), escape(rfile, quote=True)),
+              file=output_)
+
+        for result in results:
+            print("<h2 id='{0}'>{0}</h2>".format(escape(result["path"],
+                                                       quote=True)),
+                  file=output_)
+            print("<p>chi2/ndf: {0}, KS: {1}</p>".format(
+                      format_(result["chi2"]), format_(result["ks"])),
+                  file=output_)
+            print("<img src='{0}'/>".format(escape(result["filename"],
+                                                    quote=True)),
+                  file=output_)
+
+        print("</body></html>", file=output_)
+
+def different_keys(lfile, rfile, tolerance=0, verbose=True, plot_patterns=[]):
+    '''
+    Paths of histograms that differ in two files (see root.diff.walk), set
+    of these paths with different binning and flag if files content is
+    different. Paths are limited with plot patterns
+    '''
+
+    report = root.diff.compare(lfile, rfile, tolerance,
+                               plot_patterns=plot_patterns)
+
+    if report["different"] and verbose:
         print("warning: files have different content", file=sys.stderr)
         print()
 
-    if not common_keys:
+    keys = [entry["path"] for entry in report["entries"]
+            if ("different" == entry["status"] and
+                entry.get("reason") in ("bins", "binning"))]
+
+    binning = set(entry["path"] for entry in report["entries"]
+                  if ("different" == entry["status"] and
+                      "binning" == entry.get("reason")))
+
+    return report["different"], keys, binning
+
+def vdiff(lfile, rfile, verbose=True, output=None, jobs=1, summary=False,
+          tolerance=0, plot_patterns=[]):
+    '''
+    Compare two files and plot diffed histograms
+
+    Histograms are compared recursively (see root.diff.compare) and only
+    these that are NOT equal are drawn: histograms with different binning
+    are drawn without ratio. The output is chosen with output argument:
+
+        None        one PDF per histogram in current folder
+        *.pdf       all histograms in one multi-page PDF
+        folder      PNG per histogram and index.html; images are drawn in
+                    jobs worker processes
+
+    Compared paths are limited with plot patterns, the same as in
+    template.loader.InputLoader, e.g.: ["/jet?/*", "/met"].
+
+    Nothing is drawn in summary mode: chi2/ndf and Kolmogorov test of each
+    different histogram are printed instead.
+
+    Usage:
+
+        vdiff("file1.root", "file2.root")
+        vdiff("file1.root", "file2.root", output="vdiff", jobs=8)
+
+    Function returns True if files are different
+    '''
+
+    result, keys, binning = different_keys(lfile, rfile, tolerance, verbose,
+                                           plot_patterns)
+
+    if not keys:
         if verbose:
-            print("no common keys are found in files")
+            print("no different histograms are found in files")
 
-        return False
+        return result
 
-    with root.tfile.topen(lfile) as lfile_:
-        with root.tfile.topen(rfile) as rfile_:
-            for key in sorted(common_keys):
-                lhist = lfile_.Get(key)
-                if not lhist:
-                    if verbose:
-                        print("failed to extract", key, "from", lfile,
-                              file=sys.stderr)
+    if output and not summary and not output.endswith(".pdf"):
+        if not os.path.isdir(output):
+            os.makedirs(output)
 
+        tasks = [(lfile, rfile, key, output, key not in binning)
+                 for key in keys]
+        if 1 < jobs:
+            pool = multiprocessing.Pool(min(jobs, len(tasks)))
+            try:
+                results = pool.map(_render, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_render(task) for task in tasks]
+
+        results = [x for x in results if x]
+        _write_index(output, lfile, rfile, results)
+
+        if verbose:
+            print("saved", len(results), "plot(s) in", output)
+
+        return result
+
+    # multi-page PDF, PDF per histogram and summary are produced in one pass
+    # over both files: canvases are released one at a time
+    stats = {}
+    with root.tfile.borrow(lfile) as lfile_:
+        with root.tfile.borrow(rfile) as rfile_:
+            if output and not summary:
+                canvas = ROOT.TCanvas("vdiff", "vdiff")
+                canvas.Print(output + "[")
+
+            for key in keys:
+                hists = _read(lfile_, rfile_, key)
+                if not hists:
                     continue
 
-                rhist = rfile_.Get(key)
-                if not rhist:
+                if summary:
+                    stats[key] = _stats(hists[0], hists[1],
+                                        key not in binning)
+
                     if verbose:
-                        print("failed to extract", key, "from", rfile,
-                              file=sys.stderr)
+                        print("{0:<60} chi2/ndf: {1:<10} KS: {2}".format(
+                              key,
+                              *("-" if x is None else "{0:.3g}".format(x)
+                                for x in (stats[key]["chi2"],
+                                          stats[key]["ks"]))))
 
                     continue
 
-                # Process plots only
-                if (not isinstance(lhist, ROOT.TH1) or
-                    not isinstance(rhist, ROOT.TH1)):
+                cmp_ = _draw(key, hists[0], hists[1], lfile, rfile,
+                             key not in binning)
+                if output:
+                    cmp_.canvas.Print(output, "Title:" + key)
+                else:
+                    cmp_.canvas.SaveAs(_filename(key, "pdf"))
 
-                    continue
+                cmp_.canvas.Close()
 
-                # Skip equal plot 
-                if lhist.Integral() == rhist.Integral():
-                    continue
+            if output and not summary:
+                canvas.Print(output + "]")
 
-                # Adjust plots style
-                lhist.SetLineColor(ROOT.kGreen + 1)
-                rhist.SetLineColor(ROOT.kRed + 1)
-
-                for hist in lhist, rhist:
-                    hist.SetFillStyle(0)
-                    hist.SetLineStyle(1)
-
-                # Draw two histograms overlayed
-                cmp_ = root.comparison.Canvas()
-                cmp_.canvas.cd(1)
-
-                stack = ROOT.THStack()
-                stack.Add(lhist)
-                stack.Add(rhist)
-                stack.Draw("9 hist nostack")
-
-                # Add legend for offline review
-                legend = ROOT.TLegend(0.4, 0.7, 0.88, 0.8)
-                legend.SetTextSizePixels(18)
-                legend.SetHeader(key)
-                legend.AddEntry(lhist, lfile, "l")
-                legend.AddEntry(rhist, rfile, "l")
-                legend.Draw("9")
-
-                # Draw comparison
-                cmp_.canvas.cd(2)
-                ratio = root.comparison.ratio(lhist, rhist)
-                ratio.GetYaxis().SetTitle("#frac{GREEN}{RED}")
-                ratio.GetYaxis().SetRangeUser(0, 5)
-                ratio.Draw("9")
-
-                cmp_.canvas.Update()
-                cmp_.canvas.SaveAs(key + ".pdf")
+    if summary and output:
+        with open(output, 'w') as output_:
+            json.dump(stats, output_, indent=4, sort_keys=True)
 
     return result
 
 if "__main__" == __name__:
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="usage: %prog [options] file1.root file2.root")
+    parser.add_option("-o", "--output", action="store", default=None,
+                      help=("multi-page PDF if ends with .pdf, folder with "
+                            "PNGs and index.html otherwise; JSON file in "
+                            "summary mode"))
+    parser.add_option("-j", "--jobs", action="store", type="int", default=1,
+                      help="number of processes drawing PNGs")
+    parser.add_option("--summary", action="store_true", default=False,
+                      help="print chi2 and KS tests without drawing")
+    parser.add_option("--tolerance", action="store", type="float", default=0,
+                      help="relative tolerance of bins comparison")
+    parser.add_option("--plots", action="store", default=None,
+                      help=("colon separated plot patterns to compare, "
+                            "e.g.: /jet?/*:/met"))
+
+    options, args = parser.parse_args()
+
     try:
-        if len(sys.argv) != 3:
+        if len(args) != 2:
             raise RuntimeError("usage: {0} file1.root file2.root".format(
                                sys.argv[0]))
 
-        for filename in sys.argv[1:]:
+        for filename in args:
             if not os.path.exists(filename):
                 raise RuntimeError("file does not exist " + filename)
 
-        sys.argv.append("-b") # make ROOT work in batch mode
+        if 1 > options.jobs:
+            raise RuntimeError("number of jobs should be positive")
+
+        ROOT.gROOT.SetBatch(True) # make ROOT work in batch mode
 
-        sys.exit(1 if vdiff(*sys.argv[1:]) else 0)
+        sys.exit(1 if vdiff(*args, output=options.output, jobs=options.jobs,
+                            summary=options.summary,
+                            tolerance=options.tolerance,
+                            plot_patterns=(options.plots.split(':')
+                                           if options.plots else [])) else 0)
 
     except RuntimeError as error:
         print(error, file=sys.stderr)
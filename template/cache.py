@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+'''
+Created by Samvel Khalatyan, Jun 15, 2012
+Copyright 2012, All rights reserved
+'''
+
+from __future__ import division, print_function
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy
+
+from root.hist import Hist
+
+# increase whenever the npz layout changes: old files are not used
+FORMAT_VERSION = 2
+
+def write(output_, plots):
+    '''
+    Save plots into open file in NumPy npz format. Plots are given as
+    dictionary with keys being plot paths and values are Hist objects
+    '''
+
+    meta = []
+    arrays = {}
+    for index, (plot_key, hist) in enumerate(sorted(plots.items())):
+        prefix = str(index) + '.'
+        info = {"key": plot_key,
+                "class": hist.class_name,
+                "name": hist.name,
+                "title": hist.title,
+                "entries": hist.entries,
+                "axes": []}
+
+        for axis_index, axis in enumerate(hist.axes):
+            if axis["edges"] is not None:
+                arrays[prefix + str(axis_index) + ".edges"] = axis["edges"]
+
+            info["axes"].append(dict((k, v) for k, v in axis.items()
+                                     if "edges" != k))
+
+        arrays[prefix + "contents"] = hist.contents
+        if hist.sumw2 is not None:
+            arrays[prefix + "sumw2"] = hist.sumw2
+
+        if hist.stats is not None:
+            arrays[prefix + "stats"] = hist.stats
+
+        meta.append(info)
+
+    arrays["meta"] = numpy.array(json.dumps(meta))
+
+    numpy.savez(output_, **arrays)
+
+def read(input_):
+    '''
+    Yield (key, Hist) pairs from the npz file opened with numpy.load. Arrays
+    are read one plot at a time
+    '''
+
+    meta = json.loads(str(input_["meta"]))
+    for index, info in enumerate(meta):
+        prefix = str(index) + '.'
+        for axis_index, axis in enumerate(info["axes"]):
+            edges = prefix + str(axis_index) + ".edges"
+            axis["edges"] = input_[edges] if edges in input_ else None
+
+        sumw2 = prefix + "sumw2"
+        stats = prefix + "stats"
+        yield info["key"], Hist(
+                axes=info["axes"],
+                contents=input_[prefix + "contents"],
+                sumw2=input_[sumw2] if sumw2 in input_ else None,
+                class_name=info["class"],
+                name=info["name"],
+                title=info["title"],
+                entries=info["entries"],
+                stats=input_[stats] if stats in input_ else None)
+
+class Cache(object):
+    '''
+    On-disk cache of the loaded and normalized input plots
+
+    Each input is stored in a separate NumPy npz file. The file name is
+    a hash of the input filename, its size and modification time, the plot
+    patterns, normalization and loader used, e.g. any change to the input file
+    automatically invalidates the cached plots.
+
+    The plots are kept as arrays (see root.hist.Hist): inputs with plots that
+    can not be converted without loss (see root.hist.lossless) are not
+    cached. The cache total size is limited: the least recently used files
+    are removed once the limit is reached.
+    '''
+
+    def __init__(self, path, size=1024):
+        ''' Initialize the cache
+
+        the arguments are:
+
+            path    folder to keep cached files in
+            size    maximum cache size in MB
+        '''
+
+        self._path = path
+        self._size = size * 1024 * 1024
+
+    @property
+    def path(self):
+        '''Access cache folder'''
+
+        return self._path
+
+    def key(self, filename, plot_patterns, normalization, loader):
+        '''
+        Generate the cache key for the input file
+
+        None is returned if input file does not exist
+        '''
+
+        if not os.path.exists(filename):
+            return None
+
+        stat = os.stat(filename)
+        fingerprint = repr((FORMAT_VERSION,
+                            os.path.abspath(filename),
+                            stat.st_size,
+                            stat.st_mtime,
+                            sorted(set(plot_patterns)),
+                            normalization,
+                            loader.__module__ + '.' + loader.__name__))
+
+        return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        '''Return plots for the key or None if nothing is cached'''
+
+        if not key:
+            return None
+
+        filename = self._filename(key)
+        if not os.path.exists(filename):
+            return None
+
+        try:
+            with numpy.load(filename) as input_:
+                plots = dict(read(input_))
+
+        except (IOError, OSError, KeyError, ValueError):
+            # corrupted or incompatible cache file: it will be re-created
+            return None
+
+        # mark file as recently used
+        os.utime(filename, None)
+
+        return plots
+
+    def put(self, key, plots):
+        '''Store plots in cache and evict old files if needed'''
+
+        if not key:
+            return
+
+        if not os.path.isdir(self._path):
+            try:
+                os.makedirs(self._path)
+            except OSError:
+                # the folder may be created by other process in the meantime
+                if not os.path.isdir(self._path):
+                    raise
+
+        # write into temporary file first so that other processes never see
+        # incomplete cache file
+        handle, tmp_filename = tempfile.mkstemp(dir=self._path,
+                                                suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as output_:
+                write(output_, plots)
+
+            os.rename(tmp_filename, self._filename(key))
+        except:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+
+            raise
+
+        self.evict()
+
+    def evict(self):
+        '''Remove least recently used files until cache fits the limit'''
+
+        files = []
+        for name in os.listdir(self._path):
+            if not name.endswith(".npz"):
+                continue
+
+            filename = os.path.join(self._path, name)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+
+            files.append((stat.st_mtime, stat.st_size, filename))
+
+        total = sum(size for mtime, size, filename in files)
+        for mtime, size, filename in sorted(files):
+            if total <= self._size:
+                break
+
+            try:
+                os.remove(filename)
+            except OSError:
+                # file is removed by other process
+                pass
+
+            total -= size
+
+    def _filename(self, key):
+        '''Get cache filename for the key'''
+
+        return os.path.join(self._path, "{0}.npz".format(key))
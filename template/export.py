@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+'''
+Created by Samvel Khalatyan, Sep 14, 2012
+Copyright 2012, All rights reserved
+'''
+
+from __future__ import division, print_function
+
+import os
+import tempfile
+
+import numpy
+
+from root import template, tfile
+from root.hist import Hist
+from template import cache
+
+class _ObjectsLoader(template.Loader):
+    '''Read all histograms from file into dictionary with paths as keys'''
+
+    def __init__(self):
+        template.Loader.__init__(self)
+
+        self.objects = {}
+
+    def process_plot(self, hist):
+        '''Detach plot from file and store it'''
+
+        path = hist.GetDirectory().GetPath().split(':', 1)[1]
+        path = path.rstrip('/') + '/' + hist.GetName()
+
+        hist = hist.Clone()
+        hist.SetDirectory(0)
+
+        self.objects[path] = hist
+
+def _tmp_filename(filename, suffix):
+    '''Create temporary file next to the filename'''
+
+    handle, tmp_filename = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(filename)), suffix=suffix)
+    os.close(handle)
+
+    return tmp_filename
+
+def _umask():
+    '''Process umask: it can only be read by setting a new one'''
+
+    umask = os.umask(0)
+    os.umask(umask)
+
+    return umask
+
+def _replace(tmp_filename, filename):
+    '''
+    Move temporary file into place or remove it if failed. The file gets the
+    same permissions as one created with open: temporary files are private
+    '''
+
+    try:
+        os.chmod(tmp_filename, 0o666 & ~_umask())
+        os.rename(tmp_filename, filename)
+    except:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+
+        raise
+
+def write_root(filename, objects, keep=False):
+    '''
+    Write objects into a fresh ROOT file in one pass. Objects are given in
+    dictionary with keys being paths inside the file, e.g. /jet1/pt/ttbar
+    (folders are created as needed).
+
+    The file is written into temporary one and replaces the output at the end
+    so that readers never see incomplete file. Histograms that are already in
+    the output are copied unless these are overwritten if keep is True: only
+    one cycle of each object is stored, e.g. the file does not grow with
+    every run
+    '''
+
+    if keep and os.path.exists(filename):
+        loader = _ObjectsLoader()
+        loader.load(filename)
+
+        objects_ = loader.objects
+        objects_.update(objects)
+        objects = objects_
+
+    tmp_filename = _tmp_filename(filename, ".root")
+    try:
+        with tfile.topen(tmp_filename, "recreate") as output_:
+            folders = {'': output_}
+            for path, obj in sorted(objects.items()):
+                folder, name = path.rsplit('/', 1)
+                folder = folder.strip('/')
+
+                if folder not in folders:
+                    dir_ = output_
+                    for level in folder.split('/'):
+                        dir_ = dir_.GetDirectory(level) or dir_.mkdir(level)
+
+                    folders[folder] = dir_
+
+                # object is stored with its own name: key name is not used
+                # when object is read back
+                name_ = obj.GetName()
+                obj.SetName(name)
+                try:
+                    folders[folder].WriteTObject(obj, name)
+                finally:
+                    obj.SetName(name_)
+    except:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+
+        raise
+
+    _replace(tmp_filename, filename)
+
+def save(filename, plots):
+    '''
+    Save all channels plots in one pass. Plots are given in dictionary with
+    keys being plot paths and values are dictionaries of channel histograms,
+    e.g.: {"/jet1/pt": {"ttbar": hist, "data": hist}}
+
+    The format is chosen by the filename extension:
+
+        .npz    NumPy arrays (edges, contents and sumw2) of each channel plot
+        other   ROOT file with histograms stored as /plot/path/channel
+
+    The output file is replaced atomically
+    '''
+
+    flat = dict((key + '/' + channel_, hist)
+                for key, channels in plots.items()
+                for channel_, hist in channels.items())
+
+    if not filename.endswith(".npz"):
+        write_root(filename, flat)
+
+        return
+
+    tmp_filename = _tmp_filename(filename, ".npz")
+    try:
+        with open(tmp_filename, "wb") as output_:
+            cache.write(output_, dict((key, Hist.from_th1(hist))
+                                      for key, hist in flat.items()))
+    except:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+
+        raise
+
+    _replace(tmp_filename, filename)
+
+def load(filename):
+    '''
+    Load plots saved with save function. Plots are returned in the same
+    format as these were saved in
+    '''
+
+    if not os.path.exists(filename):
+        raise RuntimeError("exported plots file does not exist: " + filename)
+
+    if filename.endswith(".npz"):
+        with numpy.load(filename) as input_:
+            flat = dict((key, hist.to_th1())
+                        for key, hist in cache.read(input_))
+    else:
+        loader = _ObjectsLoader()
+        loader.load(filename)
+
+        flat = loader.objects
+
+    plots = {}
+    for path, hist in flat.items():
+        key, channel_ = path.rsplit('/', 1)
+        plots.setdefault(key, {})[channel_] = hist
+
+    return plots
+
+if "__main__" == __name__:
+    import sys
+
+    if 2 != len(sys.argv):
+        print("usage: {0} plots.(root|npz)".format(sys.argv[0]),
+              file=sys.stderr)
+
+        sys.exit(1)
+
+    for key, channels in sorted(load(sys.argv[1]).items()):
+        print("{0:>45} {1}".format(key, ', '.join(sorted(channels))))
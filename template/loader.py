@@ -7,12 +7,17 @@ Copyright 2012, All rights reserved
 
 from __future__ import division, print_function
 
+import os
 import re
 import sys
 
 import ROOT
 
-from root import template
+from config import plot as plot_config
+from root import template, tfile
+from root.hist import Hist, lossless
+from util import timer
+from util.arg import translate
 
 class InputLoader(template.Loader):
     '''
@@ -22,9 +27,13 @@ class InputLoader(template.Loader):
     name
     '''
 
-    def __init__(self, plot_patterns=[]):
+    def __init__(self, plot_patterns=[], lazy=False, index=None):
         '''
-        Specify which plots will be added in patterns
+        Specify which plots will be added in patterns. Plots are not read
+        from file in lazy mode: PlotHandle is stored instead and the plot can
+        be read later on demand. Files are not scanned if index of the inputs
+        structure is given (see root.index): plots are read with direct Get
+        calls
 
         Patterns is an array of paths inside ROOT file including foler, e.g.:
 
@@ -63,22 +72,32 @@ class InputLoader(template.Loader):
         template.Loader.__init__(self)
 
         self._plots = {}
-
-        search_and_replace = {
-                r'\*': "\w*",
-                r'\?': "\w",
-                r'\[!': '[^',
-                r'\{': '(?:',
-                r'\}': ')',
-                r',': '|'
-                }
+        self._lazy = lazy
+        self._index = index
+        self._filename = None
 
         self._plot_patterns = []
+        self._dir_patterns = []
         for pattern in plot_patterns:
-            for srch, repl in search_and_replace.items():
-                pattern = re.sub(srch, repl, pattern)
+            self._plot_patterns.append(re.compile("^" + translate(pattern) +
+                                                  "$"))
+
+            # Folders are matched one level at a time to skip any
+            # sub-directory that can not host requested plots
+            if re.search(r"\{[^}]*/", pattern):
+                # the pattern can not be split by folders, e.g.: {a/b,c}
+                self._dir_patterns.append(None)
+
+                continue
 
-            self._plot_patterns.append(re.compile("^" + pattern + "$"))
+            try:
+                self._dir_patterns.append(
+                        [re.compile("^" + translate(folder) + "$")
+                         for folder in pattern.split('/')[1:-1]])
+
+            except re.error:
+                # folder is not a valid pattern on its own, e.g.: [a/b]
+                self._dir_patterns.append(None)
 
     @property
     def plots(self):
@@ -86,6 +105,88 @@ class InputLoader(template.Loader):
 
         return self._plots
 
+    def process_dir(self, path):
+        '''Scan only folders that match beginning of any pattern'''
+
+        if not self._plot_patterns:
+            return True
+
+        folders = path.split('/')[1:]
+        for patterns in self._dir_patterns:
+            if patterns is None:
+                return True
+
+            if (len(folders) <= len(patterns) and
+                all(re_.match(folder)
+                    for re_, folder in zip(patterns, folders))):
+
+                return True
+
+        return False
+
+    def match(self, path):
+        '''Check if path matches any pattern: any path matches no patterns'''
+
+        return (not self._plot_patterns or
+                any(re_.match(path) for re_ in self._plot_patterns))
+
+    def accept(self, path, class_name):
+        '''Check if plot should be loaded: only 1D plots that match patterns'''
+
+        # skip 2D and 3D plots
+        class_ = ROOT.TClass.GetClass(class_name)
+        if class_.InheritsFrom("TH2") or class_.InheritsFrom("TH3"):
+            return False
+
+        return self.match(path)
+
+    def select(self, index):
+        '''Get paths of the indexed plots that will be loaded'''
+
+        return [entry["path"] for entry in index.entries
+                if self.accept(entry["path"], entry["class"])]
+
+    def process_key(self, path, class_name):
+        '''Read only 1D plots that match any pattern'''
+
+        if not self.accept(path, class_name):
+            return False
+
+        if self._lazy:
+            # remember where the plot is and do not read it
+            self._plots[path] = PlotHandle(self._filename, path)
+
+            return False
+
+        return True
+
+    def load(self, filename):
+        '''Load plots from file and remember the filename for handles'''
+
+        self._filename = filename
+
+        if not self._index:
+            template.Loader.load(self, filename)
+
+            return
+
+        # indexed plots may be absent in the file: these are skipped
+        paths = self.select(self._index)
+        if self._lazy:
+            for path in paths:
+                self._plots[path] = PlotHandle(filename, path, required=False)
+
+            return
+
+        if not os.path.exists(filename):
+            raise RuntimeError("input file does not exit: " + filename)
+
+        with tfile.borrow(filename) as input_:
+            for path in paths:
+                hist = PlotHandle(filename, path, required=False).read(input_)
+                if hist:
+                    self._plots[path] = hist
+
     def process_plot(self, hist):
         '''Store plot'''
 
@@ -106,11 +207,180 @@ class InputLoader(template.Loader):
 
             return
 
-        clone = hist.Clone()
-        clone.SetDirectory(0)
+        with timer.span("clone plot"):
+            clone = hist.Clone()
+            clone.SetDirectory(0)
 
         self._plots[key] = clone
 
+def _read_input(task):
+    '''
+    Load single input lazily and yield normalized plots one at a time. Each
+    plot is read only when requested and is owned by the caller: the plot
+    memory is released as soon as it is not used
+    '''
+
+    input_loader, filename, plot_patterns, normalization, cache, index = task
+
+    with timer.span("open input"):
+        loader = input_loader(plot_patterns=plot_patterns, lazy=True,
+                              index=index)
+        loader.load(filename)
+
+    with tfile.borrow(filename) as input_:
+        for key, handle in loader.plots.items():
+            with timer.span("read plot"):
+                # the counter is cumulative and open files are re-used: only
+                # the difference is read by this plot
+                bytes_ = input_.GetBytesRead()
+                hist = handle.read(input_)
+                timer.add_bytes(input_.GetBytesRead() - bytes_)
+
+                if hist and normalization:
+                    hist.Scale(normalization)
+
+            if hist:
+                yield key, hist
+
+def _load_array_input(task):
+    '''
+    Worker process entry point: load input and convert plots into array based
+    histograms. Plots that can not be converted without loss (see
+    root.hist.lossless) are passed as ROOT histograms and the input is not
+    cached. The cache is checked first if one is used
+    '''
+
+    input_loader, filename, plot_patterns, normalization, cache, index = task
+
+    key = (cache.key(filename, plot_patterns, normalization, input_loader)
+           if cache else None)
+
+    plots = cache.get(key) if key else None
+    if plots is None:
+        plots = dict((plot_key, Hist.from_th1(hist) if lossless(hist)
+                                else hist)
+                     for plot_key, hist in _read_input(task))
+
+        if key and all(isinstance(plot, Hist) for plot in plots.values()):
+            cache.put(key, plots)
+
+    return plots
+
+def _pool_load_array_input(task):
+    '''
+    Pool entry point: load input as arrays and send spans recorded in the
+    worker back to the parent (see util.timer.collect)
+    '''
+
+    return timer.collect(_load_array_input, task)
+
+def _merge_profile(plots, profile):
+    '''Add worker spans into the parent profile and return plots'''
+
+    timer.merge(profile)
+
+    return plots
+
+def style(plots, ch_config, plt_config, channel, rebin=True, verbose=False):
+    '''
+    Apply channel styles, plot rebinning, axis titles and visible range to
+    the channel plots. Plots are not rebinned if rebin is False, e.g. these
+    are rebinned already. The plot configuration is looked up with resolver
+    (see config.plot.Resolver)
+    '''
+
+    # plot paths are resolved once for all channels
+    resolver = plot_config.resolver(plt_config)
+
+    info = ch_config["channel"][channel]
+    color = info["color"]
+    fill = info["fill"]
+    line = info["line"]
+    for key, plot in plots.items():
+        plot.SetLineColor(color)
+        plot.SetFillColor(color)
+
+        plot.SetFillStyle(1001 if fill else 0)
+
+        if "data" == channel:
+            plot.SetMarkerStyle(20)
+            plot.SetMarkerSize(1)
+        else:
+            plot.SetMarkerStyle(1)
+
+        plot.SetLineWidth(2)
+        if line:
+            plot.SetLineStyle(line)
+
+        axes = resolver.get(key)
+        if axes is None:
+            if verbose:
+                print("plot", key,
+                      "is not found in the template configuration",
+                      file=sys.stderr)
+
+            continue
+
+        for axis, rebin_, title, range_ in axes:
+            if rebin and rebin_ and 1 < rebin_:
+                if "y" == axis:
+                    plot.RebinY(rebin_)
+                elif "x" == axis:
+                    plot.RebinX(rebin_)
+                else:
+                    plot.Rebin(rebin_)
+
+            axis_ = plot.GetYaxis() if "y" == axis else plot.GetXaxis()
+            if title:
+                axis_.SetTitle(title)
+
+            # Apply user range to the axis if set
+            if range_:
+                axis_.SetRangeUser(*range_)
+
+        if 1 == len(axes):
+            plot.GetYaxis().SetTitle("event yield")
+
+class PlotHandle(object):
+    '''
+    Reference to the plot in the input file. The plot is read only when
+    requested
+    '''
+
+    def __init__(self, filename, path, required=True):
+        '''
+        Store filename and plot path inside the file. Plot may be absent in
+        the file if it is not required
+        '''
+
+        self.filename = filename
+        self.path = path
+        self.required = required
+
+    def read(self, input_=None):
+        '''
+        Read plot from the open file or open the file if one is not given.
+        The plot is detached from the file and is owned by Python. None is
+        returned if plot is not required and it is absent
+        '''
+
+        if not input_:
+            with tfile.borrow(self.filename) as input_:
+                return self.read(input_)
+
+        hist = input_.Get(self.path)
+        if not hist:
+            if not self.required:
+                return None
+
+            raise RuntimeError("failed to read {0} from {1}".format(
+                               self.path, self.filename))
+
+        hist.SetDirectory(0)
+        ROOT.SetOwnership(hist, True)
+
+        return hist
+
 class ChannelLoader(object):
     '''
     Load Channel plots
@@ -119,7 +389,8 @@ class ChannelLoader(object):
     and apply styles
     '''
 
-    def __init__(self, prefix, input_loader=InputLoader, verbose=False):
+    def __init__(self, prefix, input_loader=InputLoader, verbose=False,
+                 pool=None, cache=None, index=None):
         ''' Initialize the channel loader
 
         the arguments are:
@@ -127,16 +398,25 @@ class ChannelLoader(object):
             prefix          filename prefix to be used by input loader
             input_loader    class to be used to load inputs
             verbose         print debug info
+            pool            multiprocessing pool to load inputs in parallel
+            cache           on-disk cache of loaded inputs (template.cache)
+            index           index of inputs structure (root.index) to read
+                            plots without scanning input files
 
         All the loaded plots are kept in the plots dictionary. The keys are
         histograms paths with names (e.g. /jet1/pt) and values are histogram
-        objects
+        objects. Plots that are absent in some inputs are listed in the
+        missing dictionary with keys being the inputs
         '''
 
         self._prefix = prefix
         self._plots = None
         self._input_loader = input_loader
         self._verbose = verbose
+        self._pool = pool
+        self._cache = cache
+        self._index = index
+        self._missing = {}
 
     @property
     def plots(self):
@@ -144,6 +424,44 @@ class ChannelLoader(object):
 
         return self._plots
 
+    @property
+    def missing(self):
+        '''Access plots missing in each input'''
+
+        return self._missing
+
+    def _merge(self, plots):
+        '''
+        Add input plots to the channel running sum. Plots are expected as
+        (key, plot) pairs, where plot is ROOT histogram or Hist.
+
+        Set of the merged plots keys is returned
+        '''
+
+        keys = set()
+        for key, plot in plots:
+            keys.add(key)
+
+            sum_ = self._plots.get(key)
+            if sum_ is None:
+                self._plots[key] = plot
+            elif isinstance(plot, Hist):
+                if isinstance(sum_, Hist):
+                    sum_.add(plot)
+                else:
+                    sum_.Add(plot.to_th1())
+            elif isinstance(sum_, Hist) and lossless(plot):
+                sum_.add(Hist.from_th1(plot))
+            else:
+                # ROOT histograms that can not be converted are summed with
+                # ROOT
+                if isinstance(sum_, Hist):
+                    sum_ = self._plots[key] = sum_.to_th1()
+
+                sum_.Add(plot)
+
+        return keys
+
     def load(self, ch_config, plt_config, channel, plot_patterns=[]):
         ''' Load and process inputs
 
@@ -157,7 +475,9 @@ class ChannelLoader(object):
         '''
 
         self._plots = None
-        loaded_plots = []
+        self._missing = {}
+        names = []
+        tasks = []
         luminosity = ch_config["luminosity"]
         for input_ in ch_config["channel"][channel]["inputs"]:
             # skip input if it is disabled
@@ -171,102 +491,83 @@ class ChannelLoader(object):
             if self._verbose:
                 print("load input:", input_)
 
-            loader = self._input_loader(plot_patterns=plot_patterns)
-            loader.load("{0}.{1}.root".format(self._prefix, input_))
-
-            # Scale all loaded plots to theory and style
+            # Scale all loaded plots to theory
             info = ch_config["input"][input_]
             xsection, events = info["xsection"], info["events"]
 
+            normalization = None
             if xsection and events:
                 normalization = xsection * luminosity / events
                 if self._verbose:
                     print("normalize", input_, "to", normalization)
 
-                for hist in loader.plots.values():
-                    hist.Scale(normalization)
+            names.append(input_)
+            tasks.append((self._input_loader,
+                          "{0}.{1}.root".format(self._prefix, input_),
+                          plot_patterns,
+                          normalization,
+                          self._cache,
+                          self._index))
+
+        # inputs are added into the channel one by one: only running sum of
+        # plots and one input are kept in memory
+        if self._pool:
+            # inputs are loaded in worker processes and plots are passed as
+            # plain arrays together with the worker spans
+            inputs = (_merge_profile(*result).items()
+                      for result in self._pool.imap(_pool_load_array_input,
+                                                    tasks))
+        elif self._cache:
+            inputs = (_load_array_input(task).items() for task in tasks)
+        else:
+            inputs = (_read_input(task) for task in tasks)
 
-            loaded_plots.append(loader.plots)
+        self._plots = {}
+        loaded = []
+        for index, plots in enumerate(inputs):
+            with timer.span("merge input"):
+                loaded.append((names[index], self._merge(plots)))
+
+        # inputs may have different sets of plots: the channel has a union of
+        # all plots and absent ones are reported
+        keys = set().union(*[keys_ for input_, keys_ in loaded])
+        for input_, keys_ in loaded:
+            missing = keys - keys_
+            if not missing:
+                continue
 
-        # all the input plots are loaded: combine inputs
-        info = ch_config["channel"][channel]
-        for plots in loaded_plots:
-            if not self._plots:
-                self._plots = plots
-            else:
-                for key, plot in self._plots.items():
-                    plot.Add(plots[key])
-
-        # apply channel styles, plot rebinning etc.
-        #
-        color = info["color"]
-        fill = info["fill"]
-        line = info["line"]
+            self._missing[input_] = missing
+            print("warning: input", input_, "misses", len(missing), "plot(s):",
+                  ", ".join(sorted(missing)), file=sys.stderr)
+
+        # array based sums are converted into ROOT histograms at the end
         for key, plot in self._plots.items():
-            plot.SetLineColor(color)
-            plot.SetFillColor(color)
+            if isinstance(plot, Hist):
+                self._plots[key] = plot.to_th1()
 
-            plot.SetFillStyle(1001 if fill else 0)
+        style(self._plots, ch_config, plt_config, channel,
+              verbose=self._verbose)
 
-            if "data" == channel:
-                plot.SetMarkerStyle(20)
-                plot.SetMarkerSize(1)
-            else:
-                plot.SetMarkerStyle(1)
-
-            plot.SetLineWidth(2)
-            if line:
-                plot.SetLineStyle(line)
-
-            cfg = plt_config["plot"].get(key, None)
-            if not cfg:
-                cfgkey = '%s/%s' % (key.split('_')[0],key.split('/')[2])
-                cfg = plt_config["plot"].get(cfgkey, None)
-                if not cfg:
-                    if self._verbose:
-                        print("plot", plot,
-                            "is not found in the template configuration",
-                            file=sys.stderr)
-                    continue
-
-            if "rebin" in cfg:
-                # 1D plot
-                rebin = cfg.get("rebin")
-                if rebin and 1 < rebin:
-                    plot.Rebin(rebin)
-
-                title = cfg["title"]
-                units = cfg["units"]
-                if title:
-                    plot.GetXaxis().SetTitle(("{0} [{1}]" if units
-                                              else "{0}").format(title,
-                                                                 units))
-
-                plot.GetYaxis().SetTitle("event yield")
-
-                # Apply user range to the x-axis if set
-                range_ = cfg["range"]
-                if range_:
-                    plot.GetXaxis().SetRangeUser(*range_)
-            else:
-                # 2D plot
-                for axis, frebin, fget_axis in (
-                                 ("x", ROOT.TH2.RebinX, ROOT.TH1.GetXaxis),
-                                 ("y", ROOT.TH2.RebinY, ROOT.TH1.GetYaxis)
-                                               ):
-
-                    rebin = cfg.get(axis + "rebin")
-                    if rebin and 1 < rebin:
-                        frebin(plot, rebin)
-                    
-                    title = cfg[axis + "title"]
-                    units = cfg[axis + "units"]
-                    if title:
-                        fget_axis(plot).SetTitle(("{0} [{1}]" if units
-                                                  else "{0}").format(title,
-                                                                     units))
-
-                    # Apply user range to each axis if set
-                    range_ = cfg.get(axis + "range")
-                    if range_:
-                        fget_axis(plot).SetRangeUser(*range_)
+if "__main__" == __name__:
+    import unittest
+
+    class TestInputLoader(unittest.TestCase):
+        '''Test folders pruning with plot patterns'''
+
+        def test_folders(self):
+            '''Only folders that may host plots are scanned'''
+
+            loader = InputLoader(["/jet?/pt"])
+            self.assertTrue(loader.process_dir("/jet1"))
+            self.assertFalse(loader.process_dir("/met"))
+
+        def test_braces_with_folders(self):
+            '''Braces that span folders turn pruning OFF'''
+
+            loader = InputLoader(["/{a/b,c/d}"])
+            self.assertTrue(loader.process_dir("/a"))
+            self.assertTrue(loader.process_dir("/c"))
+            self.assertTrue(loader.match("/c/d"))
+            self.assertFalse(loader.match("/c/b"))
+
+    unittest.main()
@@ -78,6 +78,43 @@ def parser():
                   "/plot1:/folder/plot2 . "
                   "BASH wildcards are supported in the names"))
 
+    parser_.add_option(
+            "-j", "--jobs",
+            action="store", type="int", default=1,
+            help=("number of processes to load inputs in parallel; "
+                  "canvases are also drawn in parallel in batch mode if "
+                  "these are saved"))
+
+    parser_.add_option(
+            "--no-cache",
+            action="store_true", default=False,
+            help="do not use cache of the loaded inputs")
+
+    parser_.add_option(
+            "--export",
+            action="store", default=None,
+            help=("save all loaded channels plots into ROOT or .npz file for "
+                  "later use with --import"))
+
+    parser_.add_option(
+            "--import",
+            action="store", default=None, dest="import_",
+            help=("load channels plots from file created with --export "
+                  "instead of reading inputs"))
+
+    parser_.add_option(
+            "--index",
+            action="store_true", default=False,
+            help=("read inputs structure from index PREFIX.index.json instead "
+                  "of scanning every file; the index is created from all "
+                  "inputs if missing or any input has changed"))
+
+    parser_.add_option(
+            "--profile",
+            action="store", default=None,
+            help=("print time spent in each processing step at the end and "
+                  "save Chrome trace into the file, e.g.: trace.json"))
+
     parser_.add_option(
             "--prefix",
             action="store", default="cms.2011",
@@ -8,15 +8,31 @@ Copyright 2012, All rights reserved
 from __future__ import print_function, division
 
 import itertools
+import multiprocessing
 import os, array
+import re
+import sys
 
+import numpy
 import ROOT
 
 from config import channel, plot, scale
-from root import comparison, error, style, stats
-from template import loader
+from root import comparison, error, hist, index, style, stats
+from template import cache, export, loader
+from util import timer
 from util.arg import split_use_and_ban
 
+# Templates instance which plots are drawn by worker processes
+_templates = None
+
+def _render(keys):
+    '''
+    Worker process entry point: draw and save the group of plots. Spans
+    recorded in the worker are returned together with filenames
+    '''
+
+    return timer.collect(_templates.render, keys)
+
 class Templates(object):
     '''
     Base for all template(s) processing units
@@ -34,6 +50,11 @@ class Templates(object):
         self._verbose = (options.verbose if options.verbose
                          else config["core"]["verbose"])
 
+        # spans of all timers are recorded if profile is requested
+        self._profile = options.profile
+        if self._profile:
+            timer.registry.enabled = True
+
         self._batch_mode = (options.batch if options.batch
                             else config["core"]["batch"])
 
@@ -132,6 +153,27 @@ class Templates(object):
         self._log = options.log
         self._ratio= options.ratio
 
+        self._jobs = options.jobs
+        if 1 > self._jobs:
+            raise RuntimeError("number of jobs should be positive")
+
+        # loaded plots may be exported or imported instead of reading inputs
+        self._export = options.export
+        self._import = options.import_
+
+        # structure of inputs is read from index instead of scanning files
+        self._index = ("{0}.index.json".format(self._prefix) if options.index
+                       else None)
+
+        # loaded inputs are cached on disk unless turned OFF
+        #
+        cache_config = config.get("cache") or {}
+        self._cache = (None if options.no_cache
+                       else cache.Cache(
+                           os.path.expanduser(cache_config.get("path",
+                                                               "~/.exo/cache")),
+                           cache_config.get("size", 1024)))
+
     @property
     def plots(self):
         ''' Access loaded plots '''
@@ -153,20 +195,131 @@ class Templates(object):
 
         ROOT.gROOT.ForceStyle()
 
-        self.load()
+        with timer.span("load"):
+            self.load()
+
+        # independent plots are drawn and saved in worker processes if more
+        # than one job is requested in batch mode
+        groups = (self.render_groups()
+                  if self._batch_mode and self._save and 1 < self._jobs
+                  else None)
+
+        if groups:
+            with timer.span("render"):
+                filenames = self.render_parallel(groups)
+
+            if self._verbose:
+                print("saved", len(filenames), "canvases")
+        else:
+            self._draw_canvases()
+
+        if self._profile:
+            print(timer.registry.summary())
+
+            timer.registry.save_trace(self._profile)
+            print("profile trace is saved in", self._profile)
+
+    def _draw_canvases(self):
+        '''
+        Draw canvases one at a time: in batch mode each canvas is saved and
+        released before the next one is created
+        '''
+
+        canvases = []
+        plots = iter(self.plot() or [])
+        while True:
+            with timer.span("draw"):
+                canvas = next(plots, None)
+
+            if canvas is None:
+                break
 
-        canvases = self.plot()
-        if canvases:
             if self._save:
-                for canvas in canvases:
-                    canvas.SaveAs(
-                        "{0}.{1}".format(canvas.GetName(), self._save))
+                with timer.span("save"):
+                    self.save_canvas(canvas)
 
-            if not self._batch_mode:
-                raw_input("enter")
+            if self._batch_mode:
+                self.close_canvas(canvas)
+            else:
+                canvases.append(canvas)
+
+        if canvases:
+            raw_input("enter")
 
             for canvas in canvases:
-                canvas.Close()
+                self.close_canvas(canvas)
+
+    def render_groups(self):
+        '''
+        Split loaded plots into groups that can be drawn independently, e.g.
+        in separate processes. Each plot is drawn separately by default.
+
+        Child classes that combine several plots in one canvas should group
+        these plots together or return None to turn parallel drawing OFF
+        '''
+
+        return [[key, ] for key in sorted(self.plots.keys())]
+
+    def render(self, keys):
+        '''
+        Draw, save and close canvases only for the sub-set of plots. The list
+        of saved files is returned
+
+        WARNING: all other plots are dropped - the method is expected to be
+                 run in a separate process
+        '''
+
+        self._plots = dict((key, self._plots[key]) for key in keys)
+
+        filenames = []
+        for canvas in self.plot() or []:
+            filenames.append(self.save_canvas(canvas))
+            self.close_canvas(canvas)
+
+        return filenames
+
+    def render_parallel(self, groups):
+        '''
+        Draw and save groups of plots in worker processes. The pool is forked
+        after plots are loaded, therefore workers get a copy of all loaded
+        plots and nothing has to be sent to the worker except plots names.
+
+        Sorted list of saved files is returned
+        '''
+
+        global _templates
+
+        _templates = self
+        pool = multiprocessing.Pool(min(self._jobs, len(groups)))
+        try:
+            filenames = []
+            for filenames_, profile in pool.map(_render, groups):
+                filenames.extend(filenames_)
+                timer.merge(profile)
+
+            filenames.sort()
+        finally:
+            pool.close()
+            pool.join()
+
+            _templates = None
+
+        return filenames
+
+    def save_canvas(self, canvas):
+        '''Save canvas in the requested format and return the filename'''
+
+        filename = "{0}.{1}".format(canvas.GetName(), self._save)
+        canvas.SaveAs(filename)
+
+        return filename
+
+    def close_canvas(self, canvas):
+        '''Close canvas and release all the objects drawn in it'''
+
+        canvas.Close()
+        if hasattr(canvas, "objects"):
+            del canvas.objects
 
     def load(self):
         '''
@@ -175,13 +328,104 @@ class Templates(object):
         Child classes may explicitly call this function to load plots
         '''
 
+        if self._import:
+            self._import_channels()
+
+            return
+
+        # inputs are loaded in worker processes if more than one job is
+        # requested: the pool is shared among all channels
+        index_ = self._load_index() if self._index else None
+
+        pool = multiprocessing.Pool(self._jobs) if 1 < self._jobs else None
+        try:
+            self._load_channels(pool, index_)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        if self._export:
+            export.save(self._export, self._plots)
+            if self._verbose:
+                print("exported", len(self._plots), "plot(s) into",
+                      self._export)
+
+    def _import_channels(self):
+        '''
+        Load channels plots from exported file. The plots are styled but not
+        rebinned, scaled or modified otherwise: these were exported after
+        processing
+        '''
+
+        plots = export.load(self._import)
+
+        self._plots = {}
+        for key, channels in plots.items():
+            if (self._plot_patterns and
+                not any(re.match("^" + loader.translate(pattern) + "$", key)
+                        for pattern in self._plot_patterns)):
+
+                continue
+
+            for channel_, hist in channels.items():
+                if channel_ not in self._channels:
+                    continue
+
+                self._plots.setdefault(key, {})[channel_] = hist
+
+        for channel_ in self._channels:
+            channel_plots = dict((key, channels[channel_])
+                                 for key, channels in self._plots.items()
+                                 if channel_ in channels)
+
+            if not channel_plots:
+                print("warning: channel", channel_, "is not found in",
+                      self._import, file=sys.stderr)
+
+                continue
+
+            loader.style(channel_plots, self._channel_config,
+                         self._plot_config, channel_, rebin=False,
+                         verbose=self._verbose)
+
+    def _load_index(self):
+        '''
+        Load index of inputs structure; the index is created from all
+        existing inputs if it is missing or any of the inputs has changed
+        '''
+
+        inputs = []
+        for channel_ in sorted(self._channels):
+            for input_ in self._channel_config["channel"][channel_]["inputs"]:
+                filename = "{0}.{1}.root".format(self._prefix, input_)
+                if (self._channel_config["input"][input_]["enable"] and
+                    filename not in inputs):
+
+                    inputs.append(filename)
+
+        index_ = index.load(self._index, inputs)
+        if self._verbose:
+            plots = loader.InputLoader(self._plot_patterns).select(index_)
+            print("index", self._index, "has", len(plots),
+                  "plot(s) to be loaded")
+
+        return index_
+
+    def _load_channels(self, pool=None, index_=None):
+        '''Load channels one by one and store plots'''
+
         bg_channels = set(["mc", ])
         channel.expand(self._channel_config, bg_channels)
         for channel_ in self._channels:
             ch_loader = self._channel_loader(self._prefix,
-                                             verbose=self._verbose)
-            ch_loader.load(self._channel_config, self._plot_config, channel_,
-                           plot_patterns=self._plot_patterns)
+                                             verbose=self._verbose,
+                                             pool=pool,
+                                             cache=self._cache,
+                                             index=index_)
+            with timer.span("load channel"):
+                ch_loader.load(self._channel_config, self._plot_config,
+                               channel_, plot_patterns=self._plot_patterns)
 
             channel_scale_ = (self._channel_scale and
                               self._channel_scale.get(channel_, None))
@@ -214,10 +458,10 @@ class Templates(object):
         Process loaded histograms and draw them
 
         The plot() method is responsible for processing loaded channels, e.g.
-        put data into Stack, conbine signals, etc.
+        put data into Stack, conbine signals, etc. Canvases are yielded one
+        at a time
         '''
 
-        canvases = []
         bg_channels = set(["mc", "qcd"])
         channel.expand(self._channel_config, bg_channels)
 
@@ -268,9 +512,7 @@ class Templates(object):
                                       signal=signal, background=background,
                                       data=data, legend=legend)
             if canvas:
-                canvases.append(canvas)
-
-        return canvases
+                yield canvas
 
     def draw_canvas(self, plot_name,
                     signal=None, background=None, data=None,
@@ -318,8 +560,12 @@ class Templates(object):
         else:
             h_axis.SetMinimum(0.1)
 
+        # background sum, ratio and its error are calculated once and shared
+        # by the uncertainty band, ratio and maximum
+        derived = self.derive(background, data if self._ratio else None)
+
         # Add backgrounds if uncertainty needs to be drawn
-        uncertainty_ = (self.get_uncertainty(background)
+        uncertainty_ = (self.get_uncertainty(background, derived)
                         if uncertainty and background
                         else None)
         canvas.objects["uncertainty"] = uncertainty_
@@ -327,9 +573,15 @@ class Templates(object):
         if uncertainty_ and legend:
             legend.AddEntry(uncertainty_, "Uncertainty", "f")
 
+        # the maximum is searched in the visible range only, e.g. the one set
+        # in the plot configuration
         h_axis.SetMaximum((10 if self._log else 1.2) *
-                          stats.maximum(hists=[data, uncertainty_],
-                                              stacks = [signal, background]))
+                          stats.maximum(hists=[data,
+                                               derived["background"]
+                                               if uncertainty_ else None],
+                                        stacks = [signal, background],
+                                        bins=(h_axis.GetXaxis().GetFirst(),
+                                              h_axis.GetXaxis().GetLast())))
 
         h_axis.Draw('9')
 
@@ -360,7 +612,7 @@ class Templates(object):
         if self._ratio:
             canvas.cd(2)
             ROOT.gPad.SetPad(0, 0, 1, 0.3)
-            ratio, error = self.get_ratio(background, data)
+            ratio, error = self.get_ratio(background, data, derived)
             canvas.objects["ratio"] = ratio
             canvas.objects["ratio_error"] = error
             r_axis = h_axis.Clone()
@@ -398,55 +650,120 @@ class Templates(object):
         if signal:
             signal.Draw("9 hist same nostack")
 
-    def get_uncertainty(self, background):
-        ''' Calculate the background uncertainty band '''
-
-        hist = None
-        if background.GetHists():
-            for bg_ in background.GetHists():
-                if not hist:
-                    hist = bg_.Clone()
-                    hist.SetDirectory(0)
-                else:
-                    hist.Add(bg_)
-
-            hist.SetMarkerSize(0)
-            hist.SetLineWidth(0)
-            hist.SetLineColor(ROOT.kGray + 3)
-            hist.SetFillStyle(3345)
-            hist.SetFillColor(ROOT.kGray + 3)
-
-        return hist
-
-    def get_ratio(self, background, data):
-        ''' Calculate data/bkg ratio '''
-        ratio = None
-        error = None
-        if background.GetHists():
-            bg = None
-            for bg_ in background.GetHists():
-                if not bg:
-                    bg = bg_.Clone()
-                    bg.SetDirectory(0)
-                else:
-                    bg.Add(bg_)
-
-            ratio = data.Clone()
-            error = data.Clone()
-            ratio.Divide(bg)
-            for i in range(ratio.GetNbinsX()):
-                error.SetBinContent(i+1,1.0)
-                if bg.GetBinContent(i+1) > 0:
-                    error.SetBinError(i+1,bg.GetBinError(i+1)/bg.GetBinContent(i+1))
-                    ratio.SetBinError(i+1,data.GetBinError(i+1)/bg.GetBinContent(i+1))
-                else:
-                    error.SetBinError(i+1, 0.0)
-            ratio.GetYaxis().SetRangeUser(0,2)
-            error.SetMarkerSize(0)
-            error.SetLineWidth(2)
-            error.SetLineColor(ROOT.kGray)
-            error.SetFillStyle(1001)
-            error.SetFillColor(ROOT.kGray)
+    def derive(self, background=None, data=None):
+        '''
+        Compute quantities derived from the plot once with array arithmetic.
+        Dictionary of Hist objects is returned (see root.hist):
+
+            background      total background with its sumw2
+            ratio           data / bkg
+            relative_error  relative background error around 1
+
+        These are shared by the uncertainty band, ratio and maximum search.
+        Quantities that can not be calculated are None
+        '''
+
+        derived = {"background": None,
+                   "ratio": None,
+                   "relative_error": None}
+
+        if not background or not background.GetHists():
+            return derived
+
+        bg = hist.total(background.GetHists())
+        derived["background"] = bg
+
+        if not data:
+            return derived
+
+        data_ = hist.Hist.from_th1(data)
+
+        bg_contents = bg.contents
+        bg_errors = bg.errors
+        data_errors = data_.errors
+
+        ratio_ = data_.copy()
+        error_ = data_.copy()
+
+        # data / bkg is calculated the same way TH1::Divide does and
+        # errors of the visible bins are replaced with data error
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            nonzero = 0 != bg_contents
+            ratio_.contents = numpy.where(nonzero,
+                                          data_.contents / bg_contents, 0)
+            ratio_errors = numpy.where(
+                    nonzero,
+                    numpy.sqrt(data_errors ** 2 * bg_contents ** 2 +
+                               bg_errors ** 2 * data_.contents ** 2) /
+                    bg_contents ** 2,
+                    0)
+
+            positive = bg_contents[1:-1] > 0
+            ratio_errors[1:-1] = numpy.where(
+                    positive,
+                    data_errors[1:-1] / bg_contents[1:-1],
+                    ratio_errors[1:-1])
+            ratio_.sumw2 = ratio_errors ** 2
+
+            error_.contents[1:-1] = 1.0
+            error_errors = data_errors.copy()
+            error_errors[1:-1] = numpy.where(
+                    positive,
+                    bg_errors[1:-1] / bg_contents[1:-1],
+                    0)
+            error_.sumw2 = error_errors ** 2
+
+        derived["ratio"] = ratio_
+        derived["relative_error"] = error_
+
+        return derived
+
+    def get_uncertainty(self, background, derived=None):
+        '''
+        Calculate the background uncertainty band. The total background is
+        taken from derived quantities if these are given (see derive)
+        '''
+
+        if not background.GetHists():
+            return None
+
+        bg = (derived or self.derive(background))["background"]
+
+        # the band takes binning from any background and sum from arrays
+        band = background.GetHists()[0].Clone()
+        band.SetDirectory(0)
+        bg.update(band)
+
+        band.SetMarkerSize(0)
+        band.SetLineWidth(0)
+        band.SetLineColor(ROOT.kGray + 3)
+        band.SetFillStyle(3345)
+        band.SetFillColor(ROOT.kGray + 3)
+
+        return band
+
+    def get_ratio(self, background, data, derived=None):
+        '''
+        Calculate data/bkg ratio and relative background error. Derived
+        quantities are used if given (see derive)
+        '''
+
+        derived = derived or self.derive(background, data)
+        if not derived["ratio"]:
+            return None, None
+
+        ratio = data.Clone()
+        error = data.Clone()
+        derived["ratio"].update(ratio)
+        derived["relative_error"].update(error)
+
+        ratio.GetYaxis().SetRangeUser(0,2)
+        error.SetMarkerSize(0)
+        error.SetLineWidth(2)
+        error.SetLineColor(ROOT.kGray)
+        error.SetFillStyle(1001)
+        error.SetFillColor(ROOT.kGray)
+
         return ratio, error
 
     def draw_legend(self, legend, width=0.29):
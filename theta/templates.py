@@ -13,8 +13,7 @@ import sys
 import ROOT
 
 from config import channel
-import root.tfile
-from template import templates
+from template import export, templates
 
 class Input(templates.Templates):
     ''' Save theta input plot(s) '''
@@ -57,23 +56,32 @@ class Input(templates.Templates):
         self._output = options.output
         self.__plots = options.plots
 
+    def render_groups(self):
+        '''All plots are written into one file: no parallel processing'''
+
+        return None
+
     def plot(self):
         ''' Process loaded histograms and draw these '''
 
-        with root.tfile.topen(self._output, 'update') as output_:
-            channels = self.plots[self.__plots]
-            for channel_, hist in channels.items():
-                channel_ = self.channel_names.get(channel_, channel_)
-                if self._theta_postfix != "":
-                    name = "{prefix}_{plot}__{channel}__{postfix}".format(
-                            prefix=self._theta_prefix,
-                            plot="mttbar",
-                            channel=channel_,
-                            postfix=self._theta_postfix)
-                else:
-                    name = "{prefix}_{plot}__{channel}".format(
-                            prefix=self._theta_prefix,
-                            plot="mttbar",
-                            channel=channel_)
-                hist.SetName(name)
-                hist.Write()
+        # all plots are written in one pass; plots of other runs (e.g. other
+        # prefix) are kept in the output
+        objects = {}
+        channels = self.plots[self.__plots]
+        for channel_, hist in channels.items():
+            channel_ = self.channel_names.get(channel_, channel_)
+            if self._theta_postfix != "":
+                name = "{prefix}_{plot}__{channel}__{postfix}".format(
+                        prefix=self._theta_prefix,
+                        plot="mttbar",
+                        channel=channel_,
+                        postfix=self._theta_postfix)
+            else:
+                name = "{prefix}_{plot}__{channel}".format(
+                        prefix=self._theta_prefix,
+                        plot="mttbar",
+                        channel=channel_)
+            hist.SetName(name)
+            objects['/' + name] = hist
+
+        export.write_root(self._output, objects, keep=True)
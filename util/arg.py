@@ -5,6 +5,8 @@ Created by Samvel Khalatyan, Feb 29, 2012
 Copyright 2011, All rights reserved
 '''
 
+import re
+
 def split_use_and_ban(values):
     '''
     Put all the values starting with '-' into ban set and the rest into use
@@ -21,6 +23,26 @@ def split_use_and_ban(values):
 
     return use, ban
 
+def translate(pattern):
+    '''
+    Convert BASH wildcards in the plot pattern into regular expression
+
+    Read template.loader.InputLoader description for the list of supported
+    wildcards
+    '''
+
+    # the order of replacements matters: braces introduce '?' symbols
+    # backslashes are escaped in the replacement templates
+    for srch, repl in ((r'\*', r"\\w*"),
+                       (r'\?', r"\\w"),
+                       (r'\[!', '[^'),
+                       (r'\{', '(?:'),
+                       (r'\}', ')'),
+                       (r',', '|')):
+        pattern = re.sub(srch, repl, pattern)
+
+    return pattern
+
 if "__main__" == __name__:
     import unittest
 
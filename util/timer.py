@@ -7,12 +7,199 @@ Copyright 2011, All rights reserved
 
 from __future__ import division, print_function
 
+import json
+import os
 import time
+import timeit
+
+# CPU time of the process: time.clock is removed in newer Python
+_cpu_time = getattr(time, "process_time", None) or time.clock
+
+class Registry(object):
+    '''
+    Process-wide profile of timed spans
+
+    Spans are nested: each span is recorded with the path of all spans that
+    were active when it started, e.g. (load, merge input, read). The wall and
+    CPU time, number of calls and bytes read are accumulated per path. Every
+    span is also kept as Chrome trace event (open the saved JSON in
+    chrome://tracing). Nothing is recorded unless registry is enabled
+    '''
+
+    def __init__(self):
+        self.enabled = False
+
+        self.reset()
+
+    def reset(self):
+        '''Remove all recorded spans'''
+
+        self.spans = {}
+        self.events = []
+
+        self._stack = []
+        self._start = timeit.default_timer()
+
+    def push(self, name):
+        '''Start new span inside the current one'''
+
+        self._stack.append({"name": name, "bytes": 0})
+
+    def pop(self, start, wall, cpu):
+        '''Finish the current span and record its time'''
+
+        frame = self._stack.pop()
+        path = tuple(span["name"] for span in self._stack) + (frame["name"], )
+
+        stats = self.spans.setdefault(path, {"calls": 0,
+                                             "wall": 0,
+                                             "cpu": 0,
+                                             "bytes": 0})
+        stats["calls"] += 1
+        stats["wall"] += wall
+        stats["cpu"] += cpu
+        stats["bytes"] += frame["bytes"]
+
+        self.events.append({"name": frame["name"],
+                            "cat": path[0],
+                            "ph": "X",
+                            "ts": (start - self._start) * 1e6,
+                            "dur": wall * 1e6,
+                            "pid": os.getpid(),
+                            "tid": 0,
+                            "args": {"cpu": cpu, "bytes": frame["bytes"]}})
+
+    def add_bytes(self, bytes_):
+        '''Add number of bytes read to the current span'''
+
+        if self._stack:
+            self._stack[-1]["bytes"] += bytes_
+
+    def collect(self, function, *parg, **karg):
+        '''
+        Call function and return its result with spans recorded meanwhile,
+        e.g. in worker process. Spans are recorded from scratch: the spans and
+        stack inherited from the parent process are kept aside. The profile is
+        None if registry is disabled
+        '''
+
+        if not self.enabled:
+            return function(*parg, **karg), None
+
+        state = self._stack, self.spans, self.events
+        self._stack, self.spans, self.events = [], {}, []
+        try:
+            result = function(*parg, **karg)
+            profile = self.spans, self.events
+        finally:
+            self._stack, self.spans, self.events = state
+
+        return result, profile
+
+    def merge(self, profile):
+        '''
+        Add spans collected in other process (see collect) inside the current
+        span
+        '''
+
+        if not profile:
+            return
+
+        spans, events = profile
+        prefix = tuple(span["name"] for span in self._stack)
+        for path, stats in spans.items():
+            stats_ = self.spans.setdefault(prefix + path, {"calls": 0,
+                                                           "wall": 0,
+                                                           "cpu": 0,
+                                                           "bytes": 0})
+            for name, value in stats.items():
+                stats_[name] += value
+
+        for event in events:
+            if prefix:
+                event = dict(event, cat=prefix[0])
+
+            self.events.append(event)
+
+    def summary(self):
+        '''Format table of all spans: nested spans are indented'''
+
+        lines = ["{0:<40} {1:>7} {2:>10} {3:>10} {4:>12}".format(
+                 "span", "calls", "wall, s", "cpu, s", "bytes")]
+
+        for path, stats in sorted(self.spans.items()):
+            lines.append("{0:<40} {1:>7} {2:>10.4f} {3:>10.4f} {4:>12}".format(
+                         "  " * (len(path) - 1) + path[-1],
+                         stats["calls"], stats["wall"], stats["cpu"],
+                         stats["bytes"]))
+
+        return '\n'.join(lines)
+
+    def save_trace(self, filename):
+        '''Save spans in Chrome trace format'''
+
+        with open(filename, 'w') as output_:
+            json.dump({"traceEvents": self.events,
+                       "displayTimeUnit": "ms"}, output_)
+
+# spans of all Timers are recorded here
+registry = Registry()
+
+def add_bytes(bytes_):
+    '''Add number of bytes read to the current span if profile is enabled'''
+
+    if registry.enabled:
+        registry.add_bytes(bytes_)
+
+def collect(function, *parg, **karg):
+    '''
+    Call function in worker process and return (result, profile) pair: pass
+    the profile to merge in the parent process
+    '''
+
+    return registry.collect(function, *parg, **karg)
+
+def merge(profile):
+    '''Add spans collected in worker process into the current span'''
+
+    if registry.enabled:
+        registry.merge(profile)
+
+def span(label):
+    '''
+    Time block of code, e.g.:
+
+        with span("merge"):
+            ...
+    '''
+
+    return Timer(label=label)
+
+class _Method(object):
+    '''Timer bound to object instance'''
+
+    def __init__(self, timer, instance):
+        self._timer = timer
+        self._instance = instance
+
+    def __call__(self, *parg, **karg):
+        return self._timer(self._instance, *parg, **karg)
+
+    @property
+    def calls(self):
+        return self._timer.calls
+
+    @property
+    def elapsed(self):
+        return self._timer.elapsed
+
+    def __str__(self):
+        return str(self._timer)
 
 class Timer(object):
     '''
-    Function(method) decorator to count number of times function is called and
-    calculate total elapsed time. Timer can be used as decorator with and
+    Function(method) decorator and context manager to count number of calls
+    and calculate total elapsed time. Timer can be used as decorator with and
     without arguments, e.g.:
 
         @Timer
@@ -36,20 +223,22 @@ class Timer(object):
             def function2(...):
                 ...
 
+    or to block of code:
+
+        with Timer(label = "merge"):
+            ...
+
     Timer will print number of calls and elapsed time if configured to be
     verbose.
     
-    The values of calls and time elapsed can be accessed for functions in
-    a straight-forward way, e.g.:
+    The values of calls and time elapsed can be accessed in a
+    straight-forward way, e.g.:
 
         print(function1.calls)
+        print(Test().function1.elapsed)
 
-    However, methods require a direct extraction of the Timer object from
-    dictionary, e.g.:
-
-        obj = Timer.__get__(Test.__dict__["function1"], None, None)
-        print(obj.calls)
-
+    Each call is also recorded as a span in the registry if it is enabled:
+    the label or wrapped function name is used as span name
     '''
 
     def __init__(self, wrapped = None, label = '', verbose = False):
@@ -62,6 +251,7 @@ class Timer(object):
         self.__wrapped = wrapped
         self.__verbose = verbose
         self.__label = label
+        self.__starts = []
 
     def __get__(self, instance, owner):
         '''
@@ -73,12 +263,7 @@ class Timer(object):
         if not instance:
             return self
 
-        def wrapper(*parg, **karg):
-            '''Make it work as if it were a function'''
-
-            return self(instance, *parg, **karg)
-
-        return wrapper
+        return _Method(self, instance)
 
     def __call__(self, *parg, **karg):
         '''
@@ -100,16 +285,42 @@ class Timer(object):
             return self
         else:
             # wrapped object exists and can be called
-            self.__calls += 1
+            with self:
+                return self.__wrapped(*parg, **karg)
+
+    def __enter__(self):
+        '''Start timing'''
+
+        if registry.enabled:
+            registry.push(self.name)
+
+        self.__starts.append((timeit.default_timer(), _cpu_time()))
+
+        return self
+
+    def __exit__(self, error_type, error_value, error_traceback):
+        '''Stop timing and record the span'''
 
-            start = time.clock()
-            result = self.__wrapped(*parg, **karg)
-            self.__elapsed += time.clock() - start
+        start, cpu_start = self.__starts.pop()
+        wall = timeit.default_timer() - start
 
-            if self.__verbose:
-                print(self)
+        self.__calls += 1
+        self.__elapsed += wall
 
-            return result
+        if registry.enabled:
+            registry.pop(start, wall, _cpu_time() - cpu_start)
+
+        if self.__verbose:
+            print(self)
+
+    @property
+    def name(self):
+        '''
+        Span name: label or wrapped function name
+        '''
+
+        return (self.__label or
+                getattr(self.__wrapped, "__name__", str(self.__wrapped)))
 
     @property
     def calls(self):
@@ -140,7 +351,8 @@ class Timer(object):
                     wrapped = self.__wrapped,
                     calls = self.calls,
                     elapsed = self.elapsed,
-                    average = self.elapsed / self.calls)
+                    average = (self.elapsed / self.calls if self.calls
+                               else 0))
 
 
 
@@ -171,8 +383,7 @@ if "__main__" == __name__:
             return [x ** 2 for x in range(size)]
 
         def __str__(self):
-            obj = Timer.__get__(ListComprensionSilent.__dict__["__call__"],
-                                None, None)
+            obj = self.__call__
 
             return "<{Class} at 0x{ID:x}> {info}".format(
                         Class = self.__class__.__name__,
@@ -187,8 +398,7 @@ if "__main__" == __name__:
             return [x ** 2 for x in range(size)]
 
         def __str__(self):
-            obj = Timer.__get__(ListComprensionSilent.__dict__["__call__"],
-                                None, None)
+            obj = self.__call__
 
             return "<{Class} at 0x{ID:x}> {info}".format(
                         Class = self.__class__.__name__,
@@ -203,8 +413,7 @@ if "__main__" == __name__:
             return [x ** 2 for x in range(size)]
 
         def __str__(self):
-            obj = Timer.__get__(ListComprensionSilent.__dict__["__call__"],
-                                None, None)
+            obj = self.__call__
 
             return str(obj)
 
@@ -223,3 +432,17 @@ if "__main__" == __name__:
             print("{0:^9}".format("-+-"))
 
         print("-" * 50)
+
+    # record hierarchical spans
+    registry.enabled = True
+    with span("outer"):
+        for size in 1, 10, 100, 1000, 10000, 100000:
+            with span("inner"):
+                list_comp_silent_timer(size)
+
+    # spans of the "worker" are recorded inside the current span
+    with span("parent"):
+        result, profile = collect(list_comp_silent_timer, 1000)
+        merge(profile)
+
+    print(registry.summary())